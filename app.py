@@ -1,45 +1,254 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, session, g
+from flask.json.provider import DefaultJSONProvider
 import os
 import json
+import time
 from database import QuestionDatabase
 from question_generator import QuestionGenerator
+from render_cache import RenderCache
+from variant_pool import VariantPool
+from metrics import REGISTRY, CONTENT_TYPE, histogram, gauge, counter
+from question import Question, json_default
 
 os.makedirs("scraped_data", exist_ok=True)
+
+# Upper bound on variants produced by a single /api/generate/batch request
+MAX_BATCH_VARIANTS = 10000
+# Questions per topic page, and the most a client may ask for
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+QUESTION_KINDS = ("original", "generated")
+# Questions never change once saved, so their pages can be cached indefinitely;
+# listings must be revalidated because new variants keep arriving
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+# Seconds a client should wait before retrying a search while the index is built
+SEARCH_RETRY_AFTER = "5"
+
+class QuestionJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        # Questions are slotted records, not dicts; jsonify writes them as objects
+        if isinstance(o, Question):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
 app = Flask(__name__)
+app.json = QuestionJSONProvider(app)
 app.secret_key = os.urandom(24)  # for flash messages
 
-# Initialize database and question generator
-db = QuestionDatabase()
-generator = QuestionGenerator()
+# Initialize database and question generator around one shared store
+# QUESTION_DATABASE may point at a .db file to use the SQLite backend
+# LAZY_VARIANTS=1 stores generated questions as (original_id, seed) descriptors
+# WRITE_BEHIND=1 persists generated questions from a background writer thread
+db = QuestionDatabase(
+    os.environ.get("QUESTION_DATABASE", "scraped_data/question_database.json"),
+    journal=True,
+    lazy_variants=os.environ.get("LAZY_VARIANTS") == "1",
+    write_behind=os.environ.get("WRITE_BEHIND") == "1"
+)
+generator = QuestionGenerator(store=db.store)
+# The search index is built in the background; searches get a 503 until it is ready
+db.start_search_index()
+page_cache = RenderCache()
+# Ready-made variants per original, topped up in the background (size 0 disables)
+variant_pool = VariantPool(
+    generator,
+    pool_size=int(os.environ.get("VARIANT_POOL_SIZE", "5")),
+    refill_rate=float(os.environ.get("VARIANT_POOL_REFILL_RATE", "50"))
+)
+
+REQUEST_SECONDS = histogram("http_request_duration_seconds", "Time taken to handle each request, by route",
+                            ["route", "method", "status"])
+RENDER_SECONDS = histogram("page_render_seconds", "Time taken to render a page on a page cache miss", ["page"])
+
+# Everything below is computed only when /metrics is scraped
+gauge("question_bank_questions", "Questions stored per topic",
+      ["topic"], function=lambda: {(topic,): db.store.count_topic(topic) for topic in db.get_topics()})
+gauge("variant_pool_ready", "Pre-generated variants waiting in the pool",
+      function=lambda: variant_pool.stats()["ready"])
+gauge("variant_pool_originals", "Questions with a variant pool",
+      function=lambda: variant_pool.stats()["originals"])
+counter("variant_pool_hits_total", "Unseeded generations served from the pool",
+        function=lambda: variant_pool.stats()["hits"])
+counter("variant_pool_misses_total", "Unseeded generations the pool could not serve",
+        function=lambda: variant_pool.stats()["misses"])
+counter("variant_pool_refilled_total", "Variants generated by the background refill",
+        function=lambda: variant_pool.stats()["refilled"])
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # Labelled by route pattern, not path, so question IDs do not create new series
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, route, request.method,
+                            response.status_code)
+    return response
+
+def cached_page(key, version, cache_control, render):
+    """Serve render() through the page cache and answer conditional requests"""
+    def timed_render():
+        with RENDER_SECONDS.time(key[0]):
+            return render()
+    
+    if session.get('_flashes'):
+        # Pending flash messages are part of the page; never cache those renders
+        return timed_render()
+    
+    body, etag = page_cache.get_or_render(key, version, timed_render)
+    response = Response(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
 
 @app.route('/')
 def index():
     """Homepage showing all available topics"""
     topics = generator.get_topics()
-    return render_template('index.html', topics=topics)
+    return cached_page(('index',), len(topics), REVALIDATE_CACHE_CONTROL,
+                       lambda: render_template('index.html', topics=topics))
+
+def topic_page_args():
+    """Read and validate cursor, limit and kind from the query string"""
+    cursor = request.args.get('cursor') or None
+    if cursor is not None:
+        # "<seq>" or "<seq>.<n>" for a page that reaches into questions still being written
+        after, dot, skip = cursor.partition('.')
+        if not after.isdigit() or (dot and not skip.isdigit()):
+            raise ValueError("Invalid cursor")
+    
+    limit = request.args.get('limit', PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
+    kind = request.args.get('kind') or None
+    if kind is not None and kind not in QUESTION_KINDS:
+        raise ValueError("kind must be 'original' or 'generated'")
+    return cursor, limit, kind
+
+def topic_page(topic, cursor, limit, kind):
+    """One page of a topic with lazy variants rendered, including questions still being written"""
+    questions, next_cursor = db.page_topic(topic, cursor, limit, kind)
+    return [generator.resolve_question(q) for q in questions], next_cursor
 
 @app.route('/topic/<topic>')
 def topic_questions(topic):
-    """Show all questions for a specific topic"""
-    questions = generator.get_questions_by_topic(topic)
-    return render_template('topic.html', topic=topic, questions=questions)
+    """Show one page of questions for a specific topic"""
+    try:
+        cursor, limit, kind = topic_page_args()
+    except ValueError as e:
+        flash(str(e))
+        return redirect(url_for('topic_questions', topic=topic))
+    
+    def render():
+        questions, next_cursor = topic_page(topic, cursor, limit, kind)
+        return render_template('topic.html', topic=topic, questions=questions,
+                               next_cursor=next_cursor, kind=kind, limit=limit)
+    
+    # The topic's version changes whenever a question is added to it
+    return cached_page(('topic', topic, cursor, limit, kind), db.version(topic),
+                       REVALIDATE_CACHE_CONTROL, render)
+
+@app.route('/api/topic/<topic>', methods=['GET'])
+def api_topic_questions(topic):
+    """API endpoint returning one page of questions for a topic"""
+    try:
+        cursor, limit, kind = topic_page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    questions, next_cursor = topic_page(topic, cursor, limit, kind)
+    return jsonify({
+        "topic": topic,
+        "questions": questions,
+        "next_cursor": next_cursor
+    })
+
+def search_args():
+    """Read the query, topic filter and limit for a search from the query string"""
+    query = request.args.get('q', '').strip()
+    topic = request.args.get('topic') or None
+    limit = request.args.get('limit', PAGE_SIZE, type=int)
+    return query, topic, max(1, min(limit, MAX_PAGE_SIZE))
+
+@app.route('/search')
+def search():
+    """Search questions and mark schemes, best matches first"""
+    query, topic, limit = search_args()
+    
+    if query and not db.search_ready.is_set():
+        body = render_template('search.html', query=query, topic=topic, limit=limit,
+                               topics=generator.get_topics(), results=[], building=True)
+        return Response(body, status=503, mimetype='text/html', headers={'Retry-After': SEARCH_RETRY_AFTER})
+    
+    def render():
+        results = []
+        if query:
+            results = [(generator.resolve_question(question), score)
+                       for question, score in db.search_questions(query, topic, limit)]
+        return render_template('search.html', query=query, topic=topic, limit=limit,
+                               topics=generator.get_topics(), results=results)
+    
+    # Results only change when questions are added
+    return cached_page(('search', query, topic, limit), db.version(),
+                       REVALIDATE_CACHE_CONTROL, render)
+
+@app.route('/api/search', methods=['GET'])
+def api_search():
+    """API endpoint returning ranked search results; words ending in * match as prefixes"""
+    query, topic, limit = search_args()
+    if not query:
+        return jsonify({"error": "Missing query parameter q"}), 400
+    if not db.search_ready.is_set():
+        return (jsonify({"error": "Search index is still being built", "building": True}), 503,
+                {"Retry-After": SEARCH_RETRY_AFTER})
+    
+    return jsonify({
+        "query": query,
+        "topic": topic,
+        "results": [
+            {"question_id": question["id"], "score": round(score, 4),
+             "question": generator.resolve_question(question)}
+            for question, score in db.search_questions(query, topic, limit)
+        ]
+    })
 
 @app.route('/question/<question_id>')
 def view_question(question_id):
     """View a specific question"""
     question, topic = db.get_question_by_id(question_id)
     
-    # If not found in the database, try getting it from the generator
-    if question is None:
-        question = generator.get_question_by_id(question_id)
-        if question:
-            topic = question.get("topic")
-    
     if question is None:
         flash("Question not found!")
         return redirect(url_for('index'))
         
-    return render_template('question.html', question=question, topic=topic)
+    # Saved questions never change, so the rendered page never needs invalidating
+    return cached_page(('question', question_id), 0, IMMUTABLE_CACHE_CONTROL,
+                       lambda: render_template('question.html', question=generator.resolve_question(question),
+                                               topic=topic))
+
+def generate_variant(question_id, seed=None):
+    """Generate and store a variant, reusing the stored one for a repeated seed"""
+    if seed is not None:
+        existing = generator.resolve_question(db.find_variant(question_id, seed))
+        if existing:
+            return existing["id"], existing
+    
+    # Seeded requests must be reproducible, so only unseeded ones use the pool
+    new_question = variant_pool.pop(question_id) if seed is None else None
+    if new_question is None:
+        new_question = generator.generate_by_id(question_id, seed)
+    if not new_question:
+        return None, None
+    
+    # Save to database; a variant identical to a stored question comes back as that question
+    new_id = db.add_generated_question(new_question, question_id)
+    if new_id != new_question["id"]:
+        existing, _ = db.get_question_by_id(new_id)
+        new_question = generator.resolve_question(existing)
+    return new_id, new_question
 
 @app.route('/generate', methods=['POST'])
 def generate_question():
@@ -51,34 +260,91 @@ def generate_question():
         return redirect(url_for('index'))
     
     # Generate new question
-    new_question = generator.generate_by_id(question_id)
+    new_id, new_question = generate_variant(question_id, request.form.get('seed', type=int))
     
     if not new_question:
         flash("Failed to generate a new question!")
         return redirect(url_for('view_question', question_id=question_id))
     
-    # Save to database
-    new_id = db.add_generated_question(new_question, question_id)
-    
     # Redirect to the new question
     return redirect(url_for('view_question', question_id=new_id))
 
 @app.route('/api/generate/<question_id>', methods=['GET'])
 def api_generate_question(question_id):
-    """API endpoint to generate a new question"""
-    new_question = generator.generate_by_id(question_id)
+    """API endpoint to generate a new question, optionally from a given ?seed="""
+    new_id, new_question = generate_variant(question_id, request.args.get('seed', type=int))
     
     if not new_question:
         return jsonify({"error": "Failed to generate question"}), 404
     
-    # Save to database
-    new_id = db.add_generated_question(new_question, question_id)
-    
     return jsonify({
         "success": True,
         "question_id": new_id,
         "question": new_question
     })
 
+@app.route('/api/pool/stats', methods=['GET'])
+def api_pool_stats():
+    """API endpoint exposing variant pool sizes and hit rates"""
+    return jsonify(variant_pool.stats())
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for requests, generation, persistence, pools and the scraper"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/api/generate/batch', methods=['POST'])
+def api_generate_batch():
+    """API endpoint to generate many variants, streamed back as NDJSON"""
+    payload = request.get_json(silent=True)
+    items = payload.get("items") if isinstance(payload, dict) else payload
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Expected a list of items with a question_id or topic"}), 400
+    
+    for item in items:
+        if not isinstance(item, dict) or not (item.get("question_id") or item.get("topic")):
+            return jsonify({"error": "Each item needs a question_id or topic"}), 400
+        if not isinstance(item.get("count", 1), int) or item.get("count", 1) < 1:
+            return jsonify({"error": "count must be a positive integer"}), 400
+        if item.get("seed") is not None and not isinstance(item["seed"], int):
+            return jsonify({"error": "seed must be an integer"}), 400
+    
+    if sum(item.get("count", 1) for item in items) > MAX_BATCH_VARIANTS:
+        return jsonify({"error": f"At most {MAX_BATCH_VARIANTS} variants per request"}), 400
+    
+    def generate():
+        generated = []
+        seen = {}
+        seen_text = {}
+        try:
+            for original_id, new_question in generator.generate_batch(items):
+                if new_question is None:
+                    yield json.dumps({"success": False, "error": "Failed to generate question"}) + "\n"
+                    continue
+                
+                # Identical (original, seed) pairs produce identical variants; store each once
+                key = (original_id, new_question["seed"])
+                text_key = (new_question["topic"], new_question["question_text"])
+                existing = (seen.get(key) or seen_text.get(text_key)
+                            or generator.resolve_question(db.find_variant(*key))
+                            or generator.resolve_question(db.find_duplicate(new_question)))
+                if existing:
+                    yield json.dumps({"success": True, "question_id": existing["id"], "question": existing},
+                                     default=json_default) + "\n"
+                    continue
+                
+                new_id = db.prepare_generated_question(new_question, original_id)
+                seen[key] = new_question
+                seen_text[text_key] = new_question
+                generated.append(new_question)
+                yield json.dumps({"success": True, "question_id": new_id, "question": new_question},
+                                 default=json_default) + "\n"
+        finally:
+            # Persist the whole batch with one write, even if the client disconnects early
+            db.add_generated_questions(generated)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,241 @@
+import math
+import time
+from counter_rng import SPLITMIX_SAMPLER, seed_array, random_array, randint_array, choice_array
+from question_modifier import (
+    NUMBER_PATTERN, INITIAL_CONDITION_PATTERN, MAX_DETERMINANT_RESAMPLES, new_seed,
+    differential_equation_mark_scheme
+)
+from metrics import histogram, SIZE_BUCKETS
+from question import as_question
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BATCH_SECONDS = histogram("batch_modifier_duration_seconds", "Time taken to generate one batch of variants",
+                          ["modifier", "engine"])
+BATCH_SIZE = histogram("batch_modifier_variants", "Variants generated per batch", ["modifier", "engine"],
+                       buckets=SIZE_BUCKETS)
+
+# handler name -> vectorised implementation taking (question, match, seeds)
+BATCH_HANDLERS = {}
+
+def batch_handler(name):
+    """Register a vectorised counterpart for the scalar modifier called `name`
+    
+    The implementation returns (question_texts, mark_schemes) with one entry
+    per seed, None when the scalar handler would leave the question
+    unchanged, or NotImplemented to send this question down the scalar path.
+    Its output must match the scalar handler driven by CounterRandom exactly.
+    """
+    def decorator(handler):
+        BATCH_HANDLERS[name] = handler
+        return handler
+    return decorator
+
+class BatchModifier:
+    def __init__(self, modifier):
+        self.modifier = modifier
+    
+    def modify_batch(self, question, seeds=None, count=None):
+        """Return modify_question(question, seed) for every seed, vectorised where possible
+        
+        Parameters for all seeds are sampled as NumPy arrays, constraints are
+        applied by masking and answers computed array-wide; only the final
+        strings are built per variant. Without NumPy, or for handlers with no
+        vectorised counterpart, each seed goes through the scalar path.
+        """
+        if seeds is None:
+            seeds = [new_seed() for _ in range(count or 0)]
+        seeds = list(seeds)
+        if not seeds:
+            return []
+        
+        start = time.perf_counter()
+        name, handler, match = self.modifier.select_handler(question)
+        batch = BATCH_HANDLERS.get(name) if np is not None else None
+        result = NotImplemented if batch is None else batch(question, match, seed_array(seeds))
+        if result is NotImplemented:
+            variants = [self.modifier.modify_question(question, seed) for seed in seeds]
+            engine = "scalar"
+        else:
+            variants = self._build_variants(question, name, result, seeds)
+            engine = "numpy"
+        BATCH_SECONDS.observe(time.perf_counter() - start, name or "unchanged", engine)
+        BATCH_SIZE.observe(len(seeds), name or "unchanged", engine)
+        return variants
+        
+    def _build_variants(self, question, name, result, seeds):
+        """Assemble variant records from a batch handler's texts and mark schemes"""
+        if result is None:
+            texts = [question["question_text"]] * len(seeds)
+            mark_schemes = [question["mark_scheme"]] * len(seeds)
+        else:
+            texts, mark_schemes = result
+        
+        # Every variant shares the original's unchanged fields, as on the scalar path
+        return as_question(question).variants(texts, mark_schemes, seeds, name, SPLITMIX_SAMPLER)
+
+def _template(text):
+    """Escape literal text for use in a %-format template"""
+    return text.replace("%", "%%")
+
+def _format_distinct(format_row, columns):
+    """Return an object array of format_row(*row) for each row of small-int columns
+    
+    Parameters are drawn from small ranges, so a batch of thousands has only
+    a few hundred distinct rows and formatting each once saves most of the work.
+    When every possible row fits in a small table, rows are found by marking
+    their keys in it rather than sorting the batch.
+    """
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    space = 1
+    ranges = []
+    for column in columns:
+        low = int(column.min())
+        size = int(column.max()) - low + 1
+        key = key * size + (column - low)
+        space *= size
+        ranges.append((low, size))
+    if space > max(4 * len(key), 4096):
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        rows = zip(*(column[first].tolist() for column in columns))
+        formatted = np.empty(len(first), dtype=object)
+        formatted[:] = [format_row(*row) for row in rows]
+        return formatted[inverse.reshape(-1)]
+    
+    present = np.zeros(space, dtype=bool)
+    present[key] = True
+    distinct = np.flatnonzero(present)
+    # Each column's values are the key's digits in the mixed radix built above
+    values = []
+    rest = distinct
+    for low, size in reversed(ranges):
+        values.append((rest % size + low).tolist())
+        rest = rest // size
+    rows = zip(*reversed(values))
+    table = np.empty(space, dtype=object)
+    table[distinct] = [format_row(*row) for row in rows]
+    return table[key]
+
+@batch_handler("modify_complex_number_question")
+def batch_complex_number(question, match, seeds):
+    real = randint_array(seeds, 0, 1, 8) * np.where(random_array(seeds, 1) > 0.5, 1, -1)
+    imag = randint_array(seeds, 2, 1, 8) * np.where(random_array(seeds, 3) > 0.5, 1, -1)
+    
+    text = question["question_text"]
+    prefix, suffix = text[:match.start()], text[match.end():]
+    
+    def render_text(new_real, new_imag):
+        return f'{prefix}z = {new_real} {"+" if new_imag >= 0 else "-"} {abs(new_imag)}i{suffix}'
+    
+    def render_mark_scheme(new_real, new_imag):
+        # Moduli and arguments are computed per distinct (real, imag) pair with the
+        # scalar functions, as np.arctan2 may differ from math.atan2 in the last bit
+        squares = new_real**2 + new_imag**2
+        argument = math.atan2(new_imag, new_real)
+        return (
+            f"|z| = √({new_real}² + {abs(new_imag)}²) = √{squares} = {math.sqrt(squares):.2f}\n"
+            f"arg(z) = tan⁻¹({new_imag}/{new_real}) = {argument:.4f} radians = {argument * 180 / math.pi:.2f}°"
+        )
+    
+    return (_format_distinct(render_text, [real, imag]).tolist(),
+            _format_distinct(render_mark_scheme, [real, imag]).tolist())
+
+@batch_handler("modify_matrix_question")
+def batch_matrix(question, match, seeds):
+    # Inverse and singularity questions are rarer and go through the scalar path
+    if "determinant" not in question["question_text"].lower():
+        return NotImplemented
+    
+    a = randint_array(seeds, 0, -5, 5)
+    b = randint_array(seeds, 1, -5, 5)
+    c = randint_array(seeds, 2, -5, 5)
+    d = randint_array(seeds, 3, -5, 5)
+    bc = b * c
+    
+    # Resample (a, d) only for the rows that are still singular, using the
+    # same draw indices the scalar retry loop would reach
+    singular = np.flatnonzero(a * d == bc)
+    for attempt in range(MAX_DETERMINANT_RESAMPLES):
+        if not len(singular):
+            break
+        a[singular] = randint_array(seeds[singular], 4 + 2 * attempt, -5, 5)
+        d[singular] = randint_array(seeds[singular], 5 + 2 * attempt, -5, 5)
+        singular = singular[a[singular] * d[singular] == bc[singular]]
+    a[singular] = 1
+    d[singular] = np.where(bc[singular] != 1, 1, -1)
+    ad = a * d
+    
+    text = question["question_text"]
+    prefix, suffix = text[:match.start()], text[match.end():]
+    
+    # Four parameters have too many combinations to format each once, but
+    # every piece below depends on only two of them
+    texts = (_format_distinct(lambda x, y: f"{prefix}A = [[{x}, {y}], ", [a, b])
+             + _format_distinct(lambda x, y: f"[{x}, {y}]]{suffix}", [c, d]))
+    mark_schemes = (_format_distinct(lambda x, y: f"det(A) = {x}×{y} - ", [a, d])
+                    + _format_distinct(lambda x, y: f"{x}×{y} = ", [b, c])
+                    + _format_distinct(lambda x, y: f"{x} - {y} = {x - y}", [ad, bc]))
+    return texts.tolist(), mark_schemes.tolist()
+
+@batch_handler("modify_differential_equation")
+def batch_differential_equation(question, match, seeds):
+    coeff = choice_array(seeds, 0, [1, 2, 3, 4])
+    rhs = choice_array(seeds, 1, [2, 3, 4, 5])
+    
+    text = question["question_text"]
+    prefix, suffix = _template(text[:match.start()]), _template(text[match.end():])
+    equation = "dy/dx + %(k)dy = %(r)de^(%(e)dx)"
+    condition = "y = %(y)d when x = %(x)d"
+    
+    # The replaced span never contains an initial condition, so the first one
+    # in the modified text is the first in the prefix, else the first in the suffix
+    initial_x = 0
+    initial_y = np.ones(len(seeds), dtype=np.int64)
+    changed = np.zeros(len(seeds), dtype=np.int64)
+    templates = [prefix + equation + suffix] * 2
+    initial_match = INITIAL_CONDITION_PATTERN.search(text, 0, match.start())
+    if initial_match:
+        templates[1] = (_template(text[:initial_match.start()]) + condition
+                        + _template(text[initial_match.end():match.start()]) + equation + suffix)
+    else:
+        initial_match = INITIAL_CONDITION_PATTERN.search(text, match.end())
+        if initial_match:
+            templates[1] = (prefix + equation + _template(text[match.end():initial_match.start()])
+                            + condition + _template(text[initial_match.end():]))
+    if initial_match:
+        initial_x = int(initial_match.group(2))
+        changed = (random_array(seeds, 2) > 0.5).astype(np.int64)
+        initial_y = np.where(changed, choice_array(seeds, 3, [1, 2, 3, 4, 5]), int(initial_match.group(1)))
+    
+    columns = [coeff, rhs, initial_y, changed]
+    texts = _format_distinct(lambda k, r, y0, change: templates[change] % {"k": k, "r": r, "e": -k, "x": initial_x, "y": y0},
+                             columns)
+    # Mark schemes come from the same symbolic solve as the scalar path, once per distinct row
+    mark_schemes = _format_distinct(lambda k, r, y0: differential_equation_mark_scheme(k, r, initial_x, y0),
+                                    [coeff, rhs, initial_y])
+    return texts.tolist(), mark_schemes.tolist()
+
+@batch_handler("modify_generic_question")
+def batch_generic(question, match, seeds):
+    text = question["question_text"]
+    numbers = list(NUMBER_PATTERN.finditer(text))
+    if not numbers:
+        return None
+    
+    # One uniform draw per number, in text order, exactly as the scalar path;
+    # Python's round() differs from NumPy's, so rounding stays per value
+    values = [float(m.group(0)) if '.' in m.group(0) else int(m.group(0)) for m in numbers]
+    columns = [[str(round(value * factor, 2)) for factor in (0.8 + (1.2 - 0.8) * random_array(seeds, j)).tolist()]
+               for j, value in enumerate(values)]
+    
+    template = _template(text[:numbers[0].start()])
+    for m, n in zip(numbers, numbers[1:]):
+        template += "%s" + _template(text[m.end():n.start()])
+    template += "%s" + _template(text[numbers[-1].end():])
+    
+    texts = list(map(template.__mod__, zip(*columns)))
+    mark_scheme = question["mark_scheme"] + "\n[Mark scheme would need to be updated with new values]"
+    return texts, [mark_scheme] * len(seeds)
@@ -0,0 +1,22 @@
+import argparse
+import os
+
+from benchmarks import micro, routes, startup
+from benchmarks.common import parse_size, make_report, emit
+
+parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                 description="Run the startup, micro and route benchmarks into one JSON report")
+parser.add_argument("--size", default="1k", help="bank size: a number, or 1k, 100k or 1m")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--calls", type=int, default=200, help="calls per operation and requests per route")
+parser.add_argument("--startup-runs", type=int, default=5)
+parser.add_argument("--output", help="write the JSON report here instead of stdout")
+args = parser.parse_args()
+
+size = parse_size(args.size)
+# Routes last: it imports app.py into this process, which the others must not see
+emit(make_report("all", {
+    "startup": startup.run(args.startup_runs, float(os.environ.get("STARTUP_BUDGET", startup.DEFAULT_BUDGET))),
+    "micro": micro.run(size, args.seed, args.calls),
+    "routes": routes.run(size, args.seed, args.calls)
+}, size=size, seed=args.seed, calls=args.calls), args.output)
@@ -0,0 +1,130 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+if __package__ in (None, ""):
+    # Run as a script: make the repository root importable, as python -m would
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import parse_size
+from web_scraper import QUESTION_TEMPLATES, fill_template, sample_mark_scheme
+from question_store import QuestionStore
+from question_modifier import QuestionModifier
+from batch_modifier import BatchModifier
+from id_allocator import default_allocator
+from question import json_default
+
+# Share of originals per topic, roughly as a full crawl of both sources lands
+TOPIC_WEIGHTS = {
+    "Complex Numbers": 0.18,
+    "Matrices": 0.16,
+    "Further Calculus": 0.20,
+    "Further Vectors": 0.10,
+    "Polar Coordinates": 0.09,
+    "Hyperbolic Functions": 0.09,
+    "Further Statistics": 0.09,
+    "Further Mechanics": 0.09
+}
+# A long-running bank is mostly generated variants
+ORIGINAL_FRACTION = 0.05
+# Variants per original follow a Zipf law: a few popular questions get most of them
+ZIPF_EXPONENT = 1.1
+
+def make_original(topic, number, template, rng):
+    """Fill a sample template into a question shaped like the scraper's"""
+    slug = topic.lower().replace(" ", "_")
+    question_text = fill_template(template, rng)
+    return {
+        "id": f"{slug}_{number}",
+        "topic": topic,
+        "question_text": question_text,
+        "mark_scheme": sample_mark_scheme(question_text),
+        "total_marks": rng.randint(3, 10),
+        "source_url": f"synthetic://{slug}/{number}"
+    }
+
+def generate_originals(count, rng):
+    """Create `count` scraped-style questions from the scraper's sample templates"""
+    topics = list(TOPIC_WEIGHTS)
+    weights = list(TOPIC_WEIGHTS.values())
+    originals = []
+    per_topic = {}
+    for topic in rng.choices(topics, weights, k=count):
+        number = per_topic[topic] = per_topic.get(topic, 0) + 1
+        originals.append(make_original(topic, number, rng.choice(QUESTION_TEMPLATES[topic]), rng))
+    return originals
+
+def variant_counts(originals, count, rng):
+    """Spread `count` variants over the originals with Zipf-distributed popularity"""
+    ranked = list(originals)
+    rng.shuffle(ranked)
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, len(ranked) + 1):
+        total += rank ** -ZIPF_EXPONENT
+        cum_weights.append(total)
+    counts = {}
+    for question in rng.choices(ranked, cum_weights=cum_weights, k=count):
+        counts[question["id"]] = counts.get(question["id"], 0) + 1
+    return counts
+
+def generate_bank(size, seed=0):
+    """Return a {topic: [questions]} bank of `size` questions, originals first within each topic
+    
+    Variants are produced by the real modifiers through the batch engine, so
+    their text, mark schemes and metadata match what the app stores.
+    """
+    rng = random.Random(seed)
+    original_count = max(1, min(size, round(size * ORIGINAL_FRACTION)))
+    originals = generate_originals(original_count, rng)
+    
+    bank = {}
+    for question in originals:
+        bank.setdefault(question["topic"], []).append(question)
+    
+    batch = BatchModifier(QuestionModifier(store=QuestionStore(bank)))
+    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    by_id = {question["id"]: question for question in originals}
+    for original_id, count in variant_counts(originals, size - original_count, rng).items():
+        seeds = [rng.getrandbits(32) for _ in range(count)]
+        for variant in batch.modify_batch(by_id[original_id], seeds):
+            variant["id"] = default_allocator.allocate(original_id)
+            variant["generated"] = True
+            variant["original_id"] = original_id
+            variant["generated_on"] = timestamp
+            bank[variant["topic"]].append(variant)
+    return bank
+
+def write_bank(path, size, seed=0):
+    """Generate a bank and save it as a question_database.json file, returning its stats"""
+    start = time.perf_counter()
+    bank = generate_bank(size, seed)
+    generated = time.perf_counter()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Written without indentation; at a million questions indenting doubles the file
+    with open(path, "w") as f:
+        json.dump(bank, f, default=json_default)
+    return {
+        "path": path,
+        "questions": sum(len(questions) for questions in bank.values()),
+        "originals": sum(1 for questions in bank.values() for q in questions if not q.get("generated")),
+        "topics": {topic: len(questions) for topic, questions in bank.items()},
+        "bytes": os.path.getsize(path),
+        "generate_s": generated - start,
+        "write_s": time.perf_counter() - generated
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic question_database.json")
+    parser.add_argument("size", help="number of questions, or 1k, 100k or 1m")
+    parser.add_argument("path", nargs="?", default="scraped_data/synthetic_database.json")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    print(json.dumps(write_bank(args.path, parse_size(args.size), args.seed), indent=2))
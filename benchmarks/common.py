@@ -0,0 +1,63 @@
+import datetime
+import json
+import platform
+import statistics
+import time
+
+# Named bank sizes accepted wherever a size is expected
+SIZES = {"1k": 1000, "100k": 100000, "1m": 1000000}
+
+def parse_size(value):
+    """Turn "1k", "100k", "1m" or a plain number into a question count"""
+    return SIZES.get(str(value).lower()) or int(value)
+
+def measure(func, repeat=5, number=1):
+    """Time `number` calls of func per round over `repeat` rounds, returning per-call seconds"""
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - start) / number)
+    return {
+        "median_s": statistics.median(rounds),
+        "min_s": min(rounds),
+        "max_s": max(rounds),
+        "repeat": repeat,
+        "number": number
+    }
+
+def measure_each(func, inputs):
+    """Time func(x) for every input separately, returning per-call percentiles"""
+    times = []
+    for value in inputs:
+        start = time.perf_counter()
+        func(value)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "median_s": statistics.median(times),
+        "p95_s": times[min(len(times) - 1, int(len(times) * 0.95))],
+        "max_s": times[-1],
+        "calls": len(times)
+    }
+
+def make_report(benchmark, results, **params):
+    """Wrap results with what is needed to compare runs: parameters, time and environment"""
+    return {
+        "benchmark": benchmark,
+        "params": params,
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results
+    }
+
+def emit(report, output=None):
+    """Print a report as JSON, or write it to `output`"""
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,119 @@
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+if __package__ in (None, ""):
+    # Run as a script: make the repository root importable, as python -m would
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import parse_size, measure, measure_each, make_report, emit
+from benchmarks.bank import write_bank, make_original
+from web_scraper import QUESTION_TEMPLATES
+from database import QuestionDatabase
+from question_generator import QuestionGenerator
+from question_modifier import QuestionModifier
+from batch_modifier import BatchModifier
+from snapshot import write_snapshot
+
+# Variants per batch when comparing the batch engine with one-at-a-time generation
+BATCH_SIZE = 1000
+
+def template_questions(seed=0):
+    """One question per sample template, so every modifier and each of its branches is covered"""
+    rng = random.Random(seed)
+    return [make_original(topic, number, template, rng)
+            for topic, templates in QUESTION_TEMPLATES.items()
+            for number, template in enumerate(templates, 1)]
+
+def bench_modifiers(modifier, questions, calls=200, seed=0):
+    """Per-variant cost of each modifier on each template, scalar and batched"""
+    batch = BatchModifier(modifier)
+    rng = random.Random(seed)
+    results = []
+    for question in questions:
+        name, _, _ = modifier.select_handler(question)
+        seeds = [rng.getrandbits(32) for _ in range(BATCH_SIZE)]
+        # Warm caches (symbolic solves, lazy imports) so one-off costs are not measured
+        batch.modify_batch(question, seeds)
+        scalar = measure(lambda: [modifier.modify_question(question, s) for s in seeds], repeat=3)
+        batched = measure(lambda: batch.modify_batch(question, seeds), repeat=3)
+        results.append({
+            "modifier": name,
+            "question_text": question["question_text"],
+            "modify_question": measure_each(lambda s: modifier.modify_question(question, s),
+                                            [rng.getrandbits(32) for _ in range(calls)]),
+            "scalar_per_variant_s": scalar["median_s"] / BATCH_SIZE,
+            "batch_per_variant_s": batched["median_s"] / BATCH_SIZE,
+            "batch_speedup": scalar["median_s"] / batched["median_s"]
+        })
+    return results
+
+def bench_store(path, calls=1000, seed=0):
+    """Cost of loading the bank and of the store operations every request relies on"""
+    rng = random.Random(seed)
+    results = {"load_database": measure(lambda: QuestionDatabase(path), repeat=3)}
+    
+    # Journal mode, as the app runs; the journal goes beside the bank in the scratch directory
+    db = QuestionDatabase(path, journal=True, compact_every=10 ** 9, compact_interval=10 ** 6)
+    generator = QuestionGenerator(store=db.store)
+    questions = db.store.get_all_questions()
+    originals = [q for q in questions if not q.get("generated")]
+    ids = [rng.choice(questions)["id"] for _ in range(calls)]
+    topics = db.get_topics()
+    
+    results["get_question_by_id"] = measure_each(db.get_question_by_id, ids)
+    results["page_topic"] = measure_each(lambda topic: db.store.page_topic(topic, "20", 20),
+                                         [rng.choice(topics) for _ in range(calls)])
+    results["create_modified_question"] = measure_each(
+        lambda question_id: generator.generate_by_id(question_id, rng.getrandbits(32)),
+        [rng.choice(originals)["id"] for _ in range(calls)])
+    pairs = []
+    for _ in range(calls):
+        original_id = rng.choice(originals)["id"]
+        pairs.append((generator.generate_by_id(original_id, rng.getrandbits(32)), original_id))
+    results["add_generated_question"] = measure_each(lambda pair: db.add_generated_question(*pair), pairs)
+    results["compact"] = measure(db.compact, repeat=1)
+    db.close()
+    
+    # The same bank as a memory-mapped binary snapshot, with bodies decoded on first access
+    snapshot_path = os.path.splitext(path)[0] + ".qsnap"
+    start = time.perf_counter()
+    with open(snapshot_path, "wb") as f:
+        write_snapshot(f, QuestionDatabase(path).store.snapshot())
+    results["write_snapshot"] = {"seconds": time.perf_counter() - start, "bytes": os.path.getsize(snapshot_path)}
+    results["load_snapshot"] = measure(lambda: QuestionDatabase(snapshot_path), repeat=3)
+    snapshot_db = QuestionDatabase(snapshot_path)
+    results["get_question_by_id_snapshot"] = measure_each(snapshot_db.get_question_by_id, ids)
+    results["page_topic_snapshot"] = measure_each(lambda topic: snapshot_db.store.page_topic(topic, "20", 20),
+                                                  [rng.choice(topics) for _ in range(calls)])
+    return results
+
+def run(size=1000, seed=0, calls=1000):
+    """Generate a bank of `size` questions in a scratch directory and benchmark against it"""
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, "question_database.json")
+        bank = write_bank(path, size, seed)
+        bank.pop("path")
+        db = QuestionDatabase(path)
+        return make_report("micro", {
+            "bank": bank,
+            "modifiers": bench_modifiers(QuestionModifier(store=db.store), template_questions(seed), seed=seed),
+            "store": bench_store(path, calls, seed)
+        }, size=size, seed=seed, calls=calls)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the modifiers and the question store")
+    parser.add_argument("--size", default="1k", help="bank size: a number, or 1k, 100k or 1m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calls", type=int, default=1000, help="calls per store operation")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    
+    emit(run(parse_size(args.size), args.seed, args.calls), args.output)
@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+if __package__ in (None, ""):
+    # Run as a script: make the repository root importable, as python -m would
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import parse_size, measure_each, make_report, emit
+from benchmarks.bank import write_bank
+
+# Variants requested per /api/generate/batch call
+BATCH_COUNT = 100
+SEARCH_QUERIES = ["determinant", "modulus argument", "integrating factor", "sinh", "e^", "particle collision",
+                  "integr*", "polar area"]
+
+def route_cases(bank, rng):
+    """Return (name, request) pairs; request(client, i) issues the i-th request for that route"""
+    questions = [q for topic_questions in bank.values() for q in topic_questions]
+    originals = [q for q in questions if not q.get("generated")]
+    topics = list(bank)
+    
+    def pick(items):
+        return lambda i: items[rng.randrange(len(items))]
+    
+    topic = pick(topics)
+    question = pick(questions)
+    original = pick(originals)
+    query = pick(SEARCH_QUERIES)
+    fixed_seed = rng.getrandbits(32)
+    return [
+        ("GET /", lambda c, i: c.get("/")),
+        ("GET /topic/<topic>", lambda c, i: c.get(f"/topic/{topic(i)}")),
+        ("GET /topic/<topic>?kind=generated", lambda c, i: c.get(f"/topic/{topic(i)}?kind=generated&cursor=20")),
+        ("GET /api/topic/<topic>", lambda c, i: c.get(f"/api/topic/{topic(i)}")),
+        ("GET /question/<id>", lambda c, i: c.get(f"/question/{question(i)['id']}")),
+        ("POST /generate", lambda c, i: c.post("/generate", data={"question_id": original(i)["id"]})),
+        ("GET /api/generate/<id>", lambda c, i: c.get(f"/api/generate/{original(i)['id']}")),
+        # The same seed again is answered from the stored variant
+        ("GET /api/generate/<id>?seed", lambda c, i: c.get(f"/api/generate/{originals[0]['id']}?seed={fixed_seed}")),
+        ("POST /api/generate/batch", lambda c, i: c.post("/api/generate/batch", json=[
+            {"topic": topic(i), "count": BATCH_COUNT}])),
+        ("GET /search", lambda c, i: c.get("/search", query_string={"q": query(i)})),
+        ("GET /api/search", lambda c, i: c.get("/api/search", query_string={"q": query(i), "topic": topic(i)})),
+        ("GET /api/pool/stats", lambda c, i: c.get("/api/pool/stats")),
+        ("GET /metrics", lambda c, i: c.get("/metrics"))
+    ]
+
+def bench_routes(app, bank, calls=200, seed=0):
+    """Time each route through the Flask test client against the imported app module"""
+    client = app.app.test_client()
+    rng = random.Random(seed)
+    results = {}
+    for name, send in route_cases(bank, rng):
+        # The first request pays for index builds, imports and cold caches
+        start = time.perf_counter()
+        first = send(client, 0)
+        first.get_data()
+        first_s = time.perf_counter() - start
+        
+        statuses = set()
+        def request(i):
+            response = send(client, i)
+            # Drain streamed bodies so their generation is part of the timing
+            response.get_data()
+            statuses.add(response.status_code)
+        result = measure_each(request, range(1, calls + 1))
+        result["first_s"] = first_s
+        result["statuses"] = sorted(statuses | {first.status_code})
+        results[name] = result
+    app.db.close()
+    return results
+
+def run(size=1000, seed=0, calls=200):
+    """Generate a bank, start the app on it in a scratch directory and benchmark every route"""
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        path = os.path.join(workdir, "question_database.json")
+        stats = write_bank(path, size, seed)
+        stats.pop("path")
+        with open(path) as f:
+            bank = json.load(f)
+        
+        # app.py reads its configuration and creates scraped_data/ on import
+        os.chdir(workdir)
+        os.environ["QUESTION_DATABASE"] = path
+        # Background pool refills would compete with the requests being timed
+        os.environ.setdefault("VARIANT_POOL_SIZE", "0")
+        start = time.perf_counter()
+        import app
+        import_s = time.perf_counter() - start
+        # Searches answer 503 until the background index build completes
+        app.db.search_ready.wait()
+        return make_report("routes", {
+            "bank": stats,
+            "app_import_s": import_s,
+            "routes": bench_routes(app, bank, calls, seed)
+        }, size=size, seed=seed, calls=calls, variant_pool_size=int(os.environ["VARIANT_POOL_SIZE"]))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end route benchmarks through the Flask test client")
+    parser.add_argument("--size", default="1k", help="bank size: a number, or 1k, 100k or 1m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calls", type=int, default=200, help="requests per route")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    
+    emit(run(parse_size(args.size), args.seed, args.calls), args.output)
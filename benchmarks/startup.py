@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds from process start to the first response; raise it deliberately, not to make CI pass
+DEFAULT_BUDGET = 1.0
+
+# Heavy modules a cold start must not import; they load on first use instead
+HEAVY_MODULES = ["sympy", "numpy"]
+
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get("/")
+done = time.perf_counter()
+print(json.dumps({
+    "status": response.status_code,
+    "import_s": imported - start,
+    "first_request_s": done - imported,
+    "heavy_modules": [name for name in %r if name in sys.modules]
+}))
+"""
+
+def measure_once(python=sys.executable):
+    """Start a fresh interpreter, import app.py and serve one request, returning the timings"""
+    with tempfile.TemporaryDirectory() as workdir:
+        # Run against an empty database in a scratch directory so the real one is untouched
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+        env["QUESTION_DATABASE"] = os.path.join(workdir, "question_database.json")
+        start = time.perf_counter()
+        completed = subprocess.run([python, "-c", CHILD_SCRIPT % (HEAVY_MODULES,)], cwd=workdir,
+                                   env=env, capture_output=True, text=True, check=True)
+        total = time.perf_counter() - start
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["total_s"] = total
+    return result
+
+def run(runs=5, budget=DEFAULT_BUDGET):
+    """Measure time-to-first-request over several cold starts and check it against the budget"""
+    results = [measure_once() for _ in range(runs)]
+    heavy = sorted({name for result in results for name in result["heavy_modules"]})
+    report = {
+        "benchmark": "startup",
+        "runs": runs,
+        "budget_s": budget,
+        "median_total_s": statistics.median(r["total_s"] for r in results),
+        "median_import_s": statistics.median(r["import_s"] for r in results),
+        "median_first_request_s": statistics.median(r["first_request_s"] for r in results),
+        "statuses": sorted({r["status"] for r in results}),
+        "heavy_modules": heavy
+    }
+    report["passed"] = (report["median_total_s"] <= budget and not heavy
+                        and report["statuses"] == [200])
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure app.py time-to-first-request")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float,
+                        default=float(os.environ.get("STARTUP_BUDGET", DEFAULT_BUDGET)),
+                        help="maximum median seconds from process start to first response")
+    args = parser.parse_args()
+    
+    report = run(args.runs, args.budget)
+    print(json.dumps(report, indent=2))
+    if not report["passed"]:
+        print("Startup budget exceeded or heavy modules imported at startup", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,90 @@
+import random
+
+MASK64 = (1 << 64) - 1
+# SplitMix64 constants
+GAMMA = 0x9E3779B97F4A7C15
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+FLOAT_SCALE = 2.0 ** -53
+
+# Sampler name recorded on variants; variants stored without one were sampled
+# with random.Random and are re-rendered that way
+SPLITMIX_SAMPLER = "splitmix64"
+LEGACY_SAMPLER = "mt19937"
+
+def draw(seed, index):
+    """Return the 64-bit value number `index` of the stream for `seed`
+    
+    Every draw is a pure function of (seed, index), so a batch can compute
+    draw k for thousands of seeds at once and get the same value the scalar
+    generator returns from its k-th call.
+    """
+    z = (seed + (index + 1) * GAMMA) & MASK64
+    z = ((z ^ (z >> 30)) * MIX1) & MASK64
+    z = ((z ^ (z >> 27)) * MIX2) & MASK64
+    return z ^ (z >> 31)
+
+class CounterRandom:
+    def __init__(self, seed):
+        self.seed = seed & MASK64
+        self.index = 0
+    
+    def next64(self):
+        """Return the next raw 64-bit draw"""
+        value = draw(self.seed, self.index)
+        self.index += 1
+        return value
+    
+    def random(self):
+        """Return a float in [0, 1) with 53 random bits"""
+        return (self.next64() >> 11) * FLOAT_SCALE
+    
+    def randint(self, a, b):
+        """Return an int in [a, b]; the modulo bias is below 2^-59 for small ranges"""
+        return a + self.next64() % (b - a + 1)
+    
+    def choice(self, seq):
+        """Return a random element of a non-empty sequence"""
+        return seq[self.next64() % len(seq)]
+    
+    def uniform(self, a, b):
+        """Return a float in [a, b), computed exactly as random.Random.uniform does"""
+        return a + (b - a) * self.random()
+
+def make_rng(seed, sampler=SPLITMIX_SAMPLER):
+    """Return the random number generator a variant with this seed and sampler uses"""
+    if sampler == LEGACY_SAMPLER:
+        return random.Random(seed)
+    return CounterRandom(seed)
+
+# Vectorised counterparts: each takes a uint64 array of seeds and a draw index
+# and returns what CounterRandom(seed) would return on its (index + 1)-th call.
+# NumPy is imported by these functions only, so the scalar path never loads it.
+
+def seed_array(seeds):
+    """Convert Python int seeds to the uint64 array the vectorised draws expect"""
+    import numpy as np
+    return np.array([seed & MASK64 for seed in seeds], dtype=np.uint64)
+
+def draw_array(seeds, index):
+    """Raw 64-bit draw `index` for every seed"""
+    import numpy as np
+    z = seeds + np.uint64(((index + 1) * GAMMA) & MASK64)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(MIX2)
+    return z ^ (z >> np.uint64(31))
+
+def random_array(seeds, index):
+    """Vectorised CounterRandom.random"""
+    import numpy as np
+    return (draw_array(seeds, index) >> np.uint64(11)).astype(np.float64) * FLOAT_SCALE
+
+def randint_array(seeds, index, a, b):
+    """Vectorised CounterRandom.randint"""
+    import numpy as np
+    return a + (draw_array(seeds, index) % np.uint64(b - a + 1)).astype(np.int64)
+
+def choice_array(seeds, index, seq):
+    """Vectorised CounterRandom.choice over a sequence of numbers"""
+    import numpy as np
+    return np.asarray(seq)[(draw_array(seeds, index) % np.uint64(len(seq))).astype(np.int64)]
@@ -0,0 +1,81 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+
+def content_hash(text):
+    """Return the SHA-256 hex digest of a page body"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class CrawlState:
+    def __init__(self, state_path="scraped_data/crawl_state.json"):
+        self.state_path = state_path
+        self.lock = threading.Lock()
+        # url -> [source, topic, url] for pages discovered but not yet merged
+        self.frontier = {}
+        # url -> {"hash": ..., "crawled_at": ..., "questions": [ids]} for pages already merged
+        self.visited = {}
+        self.load()
+    
+    def load(self):
+        """Load the saved frontier and visited set, starting empty if there is none"""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"Warning: Ignoring unreadable crawl state {self.state_path}: {e}")
+            return
+        
+        self.frontier = {page[2]: page for page in state.get("frontier", [])}
+        self.visited = state.get("visited", {})
+    
+    def save(self):
+        """Write the state atomically so an interrupted save keeps the previous one"""
+        with self.lock:
+            state = {"frontier": list(self.frontier.values()), "visited": dict(self.visited)}
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+    
+    def extend_frontier(self, pages):
+        """Queue (source, topic, url) pages, returning the saved frontier followed by new pages"""
+        with self.lock:
+            for source, topic, url in pages:
+                self.frontier.setdefault(url, [source, topic, url])
+            return [tuple(page) for page in self.frontier.values()]
+    
+    def is_unchanged(self, url, digest):
+        """True if the page was merged before with the same content"""
+        with self.lock:
+            entry = self.visited.get(url)
+            return entry is not None and entry.get("hash") == digest
+    
+    def complete(self, url, digest, question_ids=None):
+        """Record a page as merged, with the IDs of the questions it produced, and drop it from the frontier"""
+        with self.lock:
+            entry = {"hash": digest, "crawled_at": datetime.datetime.now().isoformat()}
+            previous = self.visited.get(url)
+            if question_ids is not None:
+                entry["questions"] = list(question_ids)
+            elif previous and "questions" in previous:
+                # An unchanged page still owns the questions of its last merge
+                entry["questions"] = previous["questions"]
+            self.visited[url] = entry
+            self.frontier.pop(url, None)
+    
+    def page_questions(self, url):
+        """Return the IDs of the questions recorded for a page at its last merge, or None"""
+        with self.lock:
+            entry = self.visited.get(url)
+            return entry.get("questions") if entry else None
+    
+    def pending(self):
+        """Return the number of pages still in the frontier"""
+        with self.lock:
+            return len(self.frontier)
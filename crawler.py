@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+import requests
+from metrics import histogram, counter
+
+# Status codes worth retrying; anything else in the 4xx range is final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+FETCH_SECONDS = histogram("scraper_fetch_seconds", "Time spent on each HTTP request by the crawler",
+                          ["host"])
+FETCH_ERRORS = counter("scraper_fetch_errors_total", "Crawler requests that failed or were retried", ["host"])
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+class Crawler:
+    def __init__(self, headers=None, max_workers=8, per_host_limit=2, rate=1.0, burst=1,
+                 timeout=10, max_retries=3, backoff_base=1.0, respect_robots=True):
+        self.headers = headers or {}
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.respect_robots = respect_robots
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._local = threading.local()
+        self._hosts_lock = threading.Lock()
+        self._host_slots = {}
+        self._host_buckets = {}
+        # Parsed robots.txt per scheme and host, fetched once on first contact
+        self._robots = {}
+        self._robots_locks = {}
+        self._robots_lock = threading.Lock()
+    
+    def _session(self):
+        # requests.Session is not thread-safe, so each worker keeps its own
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+    
+    def _host_limits(self, url):
+        host = urlparse(url).netloc
+        with self._hosts_lock:
+            if host not in self._host_slots:
+                rate = self.rate
+                robots = self._robots.get(self._robots_url(url))
+                delay = robots.crawl_delay(self._user_agent()) if robots else None
+                if delay:
+                    # Never go faster than the site's Crawl-delay asks
+                    rate = min(rate, 1 / float(delay))
+                self._host_slots[host] = threading.Semaphore(self.per_host_limit)
+                self._host_buckets[host] = TokenBucket(rate, self.burst)
+            return self._host_slots[host], self._host_buckets[host]
+    
+    def _user_agent(self):
+        return self.headers.get("User-Agent", "*")
+    
+    def _robots_url(self, url):
+        parts = urlparse(url)
+        return f"{parts.scheme}://{parts.netloc}/robots.txt"
+    
+    def _load_robots(self, robots_url):
+        """Fetch and parse a host's robots.txt, following the rules of urllib.robotparser"""
+        robots = RobotFileParser(robots_url)
+        try:
+            response = self._session().get(robots_url, headers=self.headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            # An unreachable robots.txt does not block the crawl; the page fetch will retry
+            print(f"Error fetching {robots_url}: {e}")
+            robots.allow_all = True
+            return robots
+        if response.status_code in (401, 403):
+            robots.disallow_all = True
+        elif response.status_code >= 400:
+            robots.allow_all = True
+        else:
+            robots.parse(response.text.splitlines())
+        return robots
+    
+    def allowed(self, url):
+        """Return whether the host's robots.txt lets this crawler fetch url"""
+        if not self.respect_robots:
+            return True
+        robots_url = self._robots_url(url)
+        with self._robots_lock:
+            host_lock = self._robots_locks.setdefault(robots_url, threading.Lock())
+        # Held while fetching so each host's robots.txt is requested only once
+        with host_lock:
+            robots = self._robots.get(robots_url)
+            if robots is None:
+                robots = self._robots[robots_url] = self._load_robots(robots_url)
+        return robots.can_fetch(self._user_agent(), url)
+    
+    def request(self, url, headers=None):
+        """Fetch a URL politely, returning the response or None after the last retry"""
+        if not self.allowed(url):
+            print(f"Skipping {url}: disallowed by robots.txt")
+            return None
+        slots, bucket = self._host_limits(url)
+        request_headers = dict(self.headers)
+        request_headers.update(headers or {})
+        
+        host = urlparse(url).netloc
+        for i in range(self.max_retries):
+            try:
+                with slots:
+                    bucket.acquire()
+                    # Timed after the rate limiter, so this is the request itself
+                    with FETCH_SECONDS.time(host):
+                        response = self._session().get(url, headers=request_headers, timeout=self.timeout)
+                if response.status_code in RETRY_STATUSES:
+                    response.raise_for_status()
+                return response
+            except requests.RequestException as e:
+                FETCH_ERRORS.inc(host)
+                print(f"Error fetching {url}: {e}")
+                if i < self.max_retries - 1:
+                    # Full jitter keeps parallel retries from hitting the host in lockstep
+                    wait_time = random.uniform(0, self.backoff_base * 2 ** i)
+                    print(f"Retrying in {wait_time:.1f} seconds...")
+                    time.sleep(wait_time)
+                else:
+                    print("Max retries reached. Skipping this URL.")
+        return None
+    
+    def fetch(self, url):
+        """Fetch a page and return its text, or None if it could not be retrieved"""
+        response = self.request(url)
+        if response is None:
+            return None
+        try:
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"Error fetching {url}: {e}")
+            return None
+        return response.text
+    
+    def fetch_all(self, items, fetch=None):
+        """Fetch many (key, url) pairs concurrently, yielding (key, url, text) as they finish"""
+        fetch = fetch or self.fetch
+        futures = {self.executor.submit(fetch, url): (key, url) for key, url in items}
+        for future in as_completed(futures):
+            key, url = futures[future]
+            yield key, url, future.result()
+    
+    def close(self):
+        """Stop the worker threads"""
+        self.executor.shutdown(wait=True)
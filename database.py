@@ -1,50 +1,398 @@
+import atexit
 import json
 import os
 import datetime
+import itertools
+import threading
+import time
+from journal import QuestionJournal, file_lock
+from question_store import QuestionStore
+from sqlite_store import SQLiteQuestionStore, SQLITE_EXTENSIONS
+from snapshot import SnapshotQuestionStore, SNAPSHOT_EXTENSIONS, write_snapshot, merged_snapshot
+from id_allocator import default_allocator
+from write_behind import WriteBehindWriter
+from dedup import DedupIndex
+from search_index import SearchIndex
+from question import Question, json_default, question_hook
+from metrics import histogram, counter, SIZE_BUCKETS
+
+PERSIST_SECONDS = histogram("persistence_write_seconds", "Time taken to persist one batch of generated questions",
+                            ["backend"])
+PERSIST_QUESTIONS = histogram("persistence_write_questions", "Generated questions persisted per write",
+                              ["backend"], buckets=SIZE_BUCKETS)
+PERSIST_BYTES = counter("persistence_write_bytes_total", "Bytes written to the journal or snapshot file",
+                        ["backend"])
+COMPACTION_SECONDS = histogram("journal_compaction_seconds", "Time taken to fold the journal into a snapshot")
+
+# Fields kept when a generated question is stored lazily; the rest is re-rendered on read
+VARIANT_DESCRIPTOR_FIELDS = ("id", "topic", "generated", "original_id", "generated_on", "seed", "modifier", "sampler")
 
 class QuestionDatabase:
-    def __init__(self, database_path="scraped_data/question_database.json"):
+    def __init__(self, database_path="scraped_data/question_database.json", journal=False,
+                 compact_every=500, compact_interval=300, store=None, lazy_variants=False,
+                 id_allocator=None, write_behind=False, write_batch_size=256,
+                 write_interval=0.5, write_queue_size=10000):
         self.database_path = database_path
-        self.questions_db = self.load_database()
+        self.id_allocator = id_allocator or default_allocator
+        self.lazy_variants = lazy_variants
+        if store is None:
+            if database_path.endswith(SQLITE_EXTENSIONS):
+                store = SQLiteQuestionStore(database_path)
+            elif database_path.endswith(SNAPSHOT_EXTENSIONS):
+                store = SnapshotQuestionStore(database_path)
+            else:
+                store = QuestionStore()
+        self.store = store
+        self.lock = self.store.lock
+        self.journal = None
+        
+        # Persistent backends write each insert themselves; only the JSON file needs loading
+        if not self.store.persistent:
+            if journal:
+                self.journal = QuestionJournal(os.path.splitext(database_path)[0] + ".journal")
+            self.store.load(self.load_database())
+        
+        # Journal mode folds the journal back into the snapshot in the background
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self._compact_requested = threading.Event()
+        self._closed = False
+        # Held from journal rotation until the rotated records are on disk in the
+        # new snapshot, so two writers never race on the temp file
+        self._compaction_lock = threading.RLock()
+        self._compactor = None
+        if self.journal:
+            self._compactor = threading.Thread(target=self._compaction_loop, daemon=True)
+            self._compactor.start()
         
+        # Write-behind mode hands persistence to a batching writer thread;
+        # questions a persistent store has not received yet stay visible here
+        self.writer = None
+        self.pending = {}
+        
+        # Exact-text and full-text indexes of stored questions, built on first use;
+        # search_ready is set once the full-text index covers the whole bank
+        self.dedup = None
+        self.search = None
+        self.search_lock = threading.Lock()
+        self.search_ready = threading.Event()
+        self._search_builder = None
+        if write_behind:
+            self.writer = WriteBehindWriter(self._persist, write_batch_size, write_interval, write_queue_size)
+        
+        if self.journal or self.writer:
+            atexit.register(self.close)
+    
     def load_database(self):
-        """Load the question database from JSON file"""
-        try:
-            with open(self.database_path, "r") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print(f"Warning: Database file not found at {self.database_path}")
-            return {}
+        """Load the question database from the JSON snapshot plus any journal records"""
+        if isinstance(self.store, SnapshotQuestionStore):
+            # A binary snapshot is mapped by the store itself; only the journal is read here
+            questions_db = {}
+        else:
+            try:
+                with open(self.database_path, "r") as f:
+                    questions_db = json.load(f, object_hook=question_hook)
+            except FileNotFoundError:
+                print(f"Warning: Database file not found at {self.database_path}")
+                questions_db = {}
+        
+        if self.journal:
+            known_ids = {q.get("id") for questions in questions_db.values() for q in questions}
+            # Includes a journal left over from an interrupted compaction, read first
+            records, _ = self.journal.read_new()
+            for record in records:
+                question = record.get("question")
+                if record.get("op") != "add" or not question or question.get("id") in known_ids:
+                    continue
+                if question.get("id") in self.store:
+                    # Already folded into a mapped snapshot
+                    continue
+                questions_db.setdefault(question["topic"], []).append(question)
+                known_ids.add(question.get("id"))
+                self.journal.record_count += 1
+        
+        return questions_db
             
+    @property
+    def questions_db(self):
+        return self.store.questions_db
+    
     def save_database(self):
         """Save the question database to JSON file"""
+        if self.store.persistent:
+            return
+        self._write_snapshot(self.store.snapshot())
+    
+    def _write_snapshot(self, snapshot):
+        """Atomically replace the snapshot file so a crash never truncates the bank"""
         # Ensure directory exists
         os.makedirs(os.path.dirname(self.database_path), exist_ok=True)
         
-        with open(self.database_path, "w") as f:
-            json.dump(self.questions_db, f, indent=2)
+        tmp_path = self.database_path + ".tmp"
+        with self._compaction_lock:
+            if self.database_path.endswith(SNAPSHOT_EXTENSIONS):
+                with open(tmp_path, "wb") as f:
+                    write_snapshot(f, snapshot)
+                    f.flush()
+                    os.fsync(f.fileno())
+            else:
+                with open(tmp_path, "w") as f:
+                    json.dump(snapshot, f, indent=2, default=json_default)
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, self.database_path)
+    
+    def compact(self):
+        """Fold the journal into a fresh snapshot and discard the replayed records"""
+        if not self.journal:
+            return self.save_database()
+        
+        shared = isinstance(self.store, SnapshotQuestionStore)
+        with COMPACTION_SECONDS.time(), self._compaction_lock, file_lock(self.database_path + ".lock"):
+            with self.lock:
+                # Everything appended before the rotation is covered by this snapshot
+                rotated_path = self.journal.rotate()
+                snapshot = None if shared else self.store.snapshot()
+        
+            if shared:
+                # Other workers append to the same journal and may have compacted since
+                # this one mapped its snapshot, so the new one is built from what is on
+                # disk: the current file plus every worker's rotated records
+                records = self.journal.replay(rotated_path) if rotated_path else ()
+                snapshot = merged_snapshot(self.database_path, (
+                    record["question"] for record in records
+                    if record.get("op") == "add" and record.get("question")))
+            self._write_snapshot(snapshot)
+            if rotated_path:
+                os.remove(rotated_path)
+        if shared:
+            self.refresh()
+    
+    def refresh(self):
+        """Pick up questions other workers sharing a mapped snapshot have stored
+        
+        Reads the records they journaled since the last call and maps the
+        snapshot again if one of them has replaced it. Costs two stat calls
+        when nothing has changed.
+        """
+        if not (self.journal and isinstance(self.store, SnapshotQuestionStore)):
+            return
+        if self.store.reopen():
+            # Another worker compacted, so the journal has been rotated since the last read
+            self.journal.rewind()
+        records, _ = self.journal.read_new()
+        questions = [record["question"] for record in records
+                     if record.get("op") == "add" and record.get("question")]
+        if questions:
+            self._absorb(questions)
+    
+    def _absorb(self, questions):
+        """Add questions already persisted by another worker to the store and indexes"""
+        with self.lock:
+            # This worker's own records, and ones a concurrent refresh took, are already in
+            questions = self.store.add_questions(
+                list({q["id"]: q for q in questions if q.get("id") not in self.store}.values()))
+            if self.dedup is not None:
+                for question in questions:
+                    if question.get("question_text"):
+                        self.dedup.add(question["question_text"], question["id"], question["topic"])
+        self._index_for_search([q for q in questions if q.get("question_text")])
+    
+    def _compaction_loop(self):
+        while not self._closed:
+            self._compact_requested.wait(self.compact_interval)
+            self._compact_requested.clear()
+            if self._closed:
+                break
+            if self.journal.record_count:
+                try:
+                    self.compact()
+                except OSError as e:
+                    print(f"Warning: Journal compaction failed: {e}")
+    
+    def close(self):
+        """Flush queued writes and journal records, compacting them into the snapshot"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self.writer:
+                # Raises if some queued questions could not be written
+                self.writer.close()
+        finally:
+            if self.journal:
+                # Let a compaction already in progress finish before the final one starts
+                self._compact_requested.set()
+                self._compactor.join()
+                if self.journal.record_count:
+                    self.compact()
+                self.journal.close()
         
     def get_topics(self):
         """Return a list of all topics in the database"""
-        return list(self.questions_db.keys())
+        return self.store.get_topics()
         
     def get_questions_by_topic(self, topic):
-        """Return all questions for a specific topic"""
-        return self.questions_db.get(topic, [])
+        """Return all questions for a specific topic, including any still queued for writing"""
+        self.refresh()
+        questions = self.store.get_questions_by_topic(topic)
+        pending = self._pending_in(topic)
+        if pending:
+            stored = {q["id"] for q in questions}
+            questions = list(questions) + [q for q in pending if q["id"] not in stored]
+        return questions
+    
+    def _pending_in(self, topic, kind=None):
+        """Questions of a topic (and kind) queued for a persistent store, oldest first"""
+        if not self.pending:
+            return []
+        with self.lock:
+            return [q for q in self.pending.values() if q["topic"] == topic and
+                    (kind is None or kind == ("generated" if q.get("generated") else "original"))]
+    
+    def page_topic(self, topic, cursor=None, limit=20, kind=None):
+        """Return (questions, next_cursor) for one page of a topic
+        
+        Questions still queued for a persistent store follow the stored ones.
+        A cursor into them reads "<seq>.<n>": n questions after the stored row
+        with that seq, counting queued questions written since, so it stays
+        valid while the writer catches up.
+        """
+        self.refresh()
+        after, _, skip = (cursor or "").partition(".")
+        pending = self._pending_in(topic, kind)
+        if not pending and not skip:
+            return self.store.page_topic(topic, cursor, limit, kind)
+        
+        skip = int(skip or 0)
+        questions, next_cursor = self.store.page_topic(topic, after or None, skip + limit, kind)
+        if next_cursor is not None:
+            return questions[skip:], next_cursor
+        # A question written between the two reads is in both; keep the stored copy
+        stored = {q["id"] for q in questions}
+        tail = list(questions) + [q for q in pending if q["id"] not in stored]
+        if skip + limit < len(tail):
+            return tail[skip:skip + limit], f"{after or 0}.{skip + limit}"
+        return tail[skip:skip + limit], None
+    
+    def version(self, topic=None):
+        """Counter that grows whenever a question is added to the topic (or anywhere), queued or stored"""
+        self.refresh()
+        if not self.pending:
+            return self.store.version(topic)
+        # Under the lock, so a question moving from the queue to the store is counted once
+        with self.lock:
+            return self.store.version(topic) + sum(
+                1 for q in self.pending.values() if topic is None or q["topic"] == topic)
         
     def get_question_by_id(self, question_id):
         """Find a question by its ID"""
-        for topic, questions in self.questions_db.items():
+        pending = self.pending.get(question_id)
+        if pending is not None:
+            return pending, pending["topic"]
+        found = self.store.get_question_by_id(question_id)
+        if found[0] is None:
+            # It may have been stored by another worker a moment ago
+            self.refresh()
+            found = self.store.get_question_by_id(question_id)
+        return found
+        
+    def find_variant(self, original_id, seed):
+        """Return an already stored variant of original_id generated with this seed"""
+        for question in list(self.pending.values()):
+            if question.get("original_id") == original_id and question.get("seed") == seed:
+                return question
+        variant = self.store.find_variant(original_id, seed)
+        if variant is None:
+            self.refresh()
+            variant = self.store.find_variant(original_id, seed)
+        return variant
+    
+    def get_generated_since(self, since):
+        """Return generated questions created at or after `since` (datetime or YYYYmmddHHMMSS)"""
+        self.refresh()
+        return self.store.get_generated_since(since)
+    
+    def variant_descriptor(self, question):
+        """Reduce a generated question to what is needed to render it again"""
+        if "seed" not in question:
+            return question
+        return Question({key: question[key] for key in VARIANT_DESCRIPTOR_FIELDS if key in question}, lazy=True)
+    
+    def _dedup_index(self):
+        # Caller holds self.lock
+        if self.dedup is None:
+            self.dedup = DedupIndex()
+            if isinstance(self.store, SnapshotQuestionStore):
+                # Questions in a mapped snapshot are found through its own text hash table
+                questions = self.store.get_added_questions()
+            else:
+                questions = self.store.get_all_questions()
             for question in questions:
-                if question.get("id") == question_id:
-                    return question, topic
-        return None, None
+                # Lazy descriptors carry no text; they are deduplicated by seed instead
+                if question.get("question_text"):
+                    self.dedup.add(question["question_text"], question["id"], question["topic"])
+        return self.dedup
+    
+    def _find_duplicate_id(self, index, question):
+        # Caller holds self.lock
+        duplicate_id = index.find(question["question_text"], question["topic"])
+        if duplicate_id is None and isinstance(self.store, SnapshotQuestionStore):
+            duplicate_id = self.store.find_text(question["question_text"], question["topic"])
+        return duplicate_id
+    
+    def find_duplicate(self, question):
+        """Return a stored question in the same topic with identical text, or None"""
+        with self.lock:
+            duplicate_id = self._find_duplicate_id(self._dedup_index(), question)
+        if duplicate_id is None:
+            return None
+        found = self.get_question_by_id(duplicate_id)
+        return found[0] if found else None
+    
+    def search_index(self):
+        """Return the full-text index, building it from the store on first use
         
-    def add_generated_question(self, question, original_id):
-        """Add a generated question to the database with a reference to original"""
-        # Generate a new ID
+        Blocks until the index covers the whole bank. Questions inserted while
+        it is being built index themselves, and lazy descriptors loaded from
+        disk are skipped as they carry no text.
+        """
+        with self.search_lock:
+            if self.search is None:
+                index = SearchIndex()
+                with self.lock:
+                    # A mapped snapshot's questions are decoded as they are indexed, outside the lock
+                    questions = itertools.chain(self.store.get_all_questions(), list(self.pending.values()))
+                    # From here on add_generated_questions keeps the index up to date
+                    self.search = index
+                for question in questions:
+                    if question.get("question_text"):
+                        index.add_question(question)
+                self.search_ready.set()
+            return self.search
+    
+    def start_search_index(self):
+        """Build the full-text index on a background thread; search_ready is set when it is done"""
+        with self.lock:
+            if self._search_builder is not None:
+                return
+            self._search_builder = threading.Thread(target=self.search_index, daemon=True)
+        self._search_builder.start()
+    
+    def search_questions(self, query, topic=None, limit=20):
+        """Return up to `limit` (question, score) pairs matching the query, best first"""
+        results = []
+        for question_id, _, score in self.search_index().search(query, topic, limit):
+            question, _ = self.get_question_by_id(question_id)
+            if question is not None:
+                results.append((question, score))
+        return results
+    
+    def prepare_generated_question(self, question, original_id):
+        """Assign an ID and generation metadata without storing the question yet"""
+        # Generate a new, collision-free ID that sorts by generation time
         timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        new_id = f"gen_{original_id}_{timestamp}"
+        new_id = self.id_allocator.allocate(original_id)
         
         # Add generation metadata
         question["id"] = new_id
@@ -52,12 +400,89 @@ class QuestionDatabase:
         question["original_id"] = original_id
         question["generated_on"] = timestamp
         
-        # Add to database
-        topic = question["topic"]
-        if topic not in self.questions_db:
-            self.questions_db[topic] = []
+        return new_id
+    
+    def add_generated_question(self, question, original_id):
+        """Add a generated question to the database with a reference to original"""
+        self.prepare_generated_question(question, original_id)
+        return self.add_generated_questions([question])[0]
+    
+    def add_generated_questions(self, questions):
+        """Store already-prepared generated questions using a single write
         
-        self.questions_db[topic].append(question)
-        self.save_database()
+        Questions whose text matches a stored question in their topic are not
+        stored again; the returned list holds the existing ID in their place.
+        """
+        if not questions:
+            return []
         
-        return new_id
+        ids = []
+        unique = []
+        with self.lock:
+            index = self._dedup_index()
+            for question in questions:
+                duplicate_id = self._find_duplicate_id(index, question)
+                if duplicate_id is None:
+                    index.add(question["question_text"], question["id"], question["topic"])
+                    unique.append(question)
+                    duplicate_id = question["id"]
+                ids.append(duplicate_id)
+        questions = unique
+        if not questions:
+            return ids
+        
+        if self.lazy_variants:
+            questions = [self.variant_descriptor(q) for q in questions]
+        
+        if self.writer:
+            # Visible immediately; the writer thread persists them in batches
+            with self.lock:
+                if self.store.persistent:
+                    self.pending.update((q["id"], q) for q in questions)
+                else:
+                    questions = self.store.add_questions(questions)
+            self.writer.put_many(questions)
+            self._index_for_search(unique)
+            return ids
+        
+        # Add to database
+        with self.lock:
+            if not self.store.persistent:
+                questions = self.store.add_questions(questions)
+            self._persist(questions)
+            
+        self._index_for_search(unique)
+        return ids
+    
+    def _index_for_search(self, questions):
+        # Runs after the questions are visible, so an index built concurrently
+        # either saw them in the store or is already set here; repeats are ignored.
+        # The full questions are indexed, as lazy descriptors carry no text
+        if self.search is not None:
+            for question in questions:
+                self.search.add_question(question)
+    
+    def _persist(self, questions):
+        """Write questions that are already in memory to durable storage"""
+        start = time.perf_counter()
+        with self.lock:
+            if self.store.persistent:
+                backend = "sqlite"
+                self.store.add_questions(questions)
+                for question in questions:
+                    self.pending.pop(question["id"], None)
+            elif self.journal:
+                backend = "journal"
+                # O(1) append instead of rewriting the whole bank
+                PERSIST_BYTES.inc(backend, amount=self.journal.append_many(
+                    [{"op": "add", "question": q} for q in questions]))
+            else:
+                backend = "snapshot"
+                self.save_database()
+                PERSIST_BYTES.inc(backend, amount=os.path.getsize(self.database_path))
+        PERSIST_SECONDS.observe(time.perf_counter() - start, backend)
+        PERSIST_QUESTIONS.observe(len(questions), backend)
+        
+        if self.journal and self.journal.record_count >= self.compact_every:
+            self._compact_requested.set()
+        
\ No newline at end of file
@@ -0,0 +1,128 @@
+import hashlib
+import random
+import re
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+WORD_PATTERN = re.compile(r"\w+")
+
+# Match levels, from strictest to loosest
+DEDUP_LEVELS = ("exact", "template", "fuzzy")
+
+# Mersenne prime used for the MinHash permutation family
+MINHASH_PRIME = (1 << 61) - 1
+
+def normalize_text(text):
+    """Collapse runs of whitespace so layout differences do not hide duplicates"""
+    return WHITESPACE_PATTERN.sub(" ", text or "").strip()
+
+def _digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def exact_key(text):
+    """Hash of the whitespace-normalised text"""
+    return _digest(normalize_text(text))
+
+def template_fingerprint(text):
+    """Hash of the text with numbers stripped, so variants of one template collide"""
+    return _digest(NUMBER_PATTERN.sub("#", normalize_text(text).lower()))
+
+def shingles(text, size=3):
+    """Return the set of word n-grams of the normalised text"""
+    words = WORD_PATTERN.findall(normalize_text(text).lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+class MinHasher:
+    def __init__(self, num_perm=64, shingle_size=3, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # A fixed seed keeps signatures comparable across runs
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, MINHASH_PRIME), rng.randrange(0, MINHASH_PRIME))
+                       for _ in range(num_perm)]
+    
+    def signature(self, text):
+        """Return the MinHash signature of the text's shingles"""
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+                  for s in shingles(text, self.shingle_size)]
+        return tuple(min((a * h + b) % MINHASH_PRIME for h in hashes) for a, b in self.params)
+
+def estimate_similarity(sig_a, sig_b):
+    """Estimate the Jaccard similarity of two MinHash signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+class DedupIndex:
+    def __init__(self, fuzzy=False, num_perm=64, bands=16, threshold=0.8):
+        # Hash -> key of the first item seen with it; every lookup and insert is O(1) expected
+        self.exact = {}
+        self.templates = {}
+        self.size = 0
+        # Optional MinHash/LSH: signatures are split into bands and only items
+        # sharing a band bucket are compared
+        self.hasher = MinHasher(num_perm) if fuzzy else None
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.signatures = {}
+        self.buckets = {}
+    
+    def _band_keys(self, signature, scope):
+        for band in range(self.bands):
+            yield (scope, band, signature[band * self.rows:(band + 1) * self.rows])
+    
+    def find(self, text, scope=None, level="exact"):
+        """Return the key of a stored duplicate of text at the given level, or None"""
+        key = self.exact.get((scope, exact_key(text)))
+        if key is not None or level == "exact":
+            return key
+        
+        key = self.templates.get((scope, template_fingerprint(text)))
+        if key is not None or level == "template" or self.hasher is None:
+            return key
+        
+        signature = self.hasher.signature(text)
+        checked = set()
+        for band_key in self._band_keys(signature, scope):
+            for candidate in self.buckets.get(band_key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if estimate_similarity(signature, self.signatures[candidate]) >= self.threshold:
+                    return candidate
+        return None
+    
+    def add(self, text, key, scope=None):
+        """Index text under key; the first key stored for a hash wins"""
+        self.exact.setdefault((scope, exact_key(text)), key)
+        self.templates.setdefault((scope, template_fingerprint(text)), key)
+        self.size += 1
+        if self.hasher is not None:
+            signature = self.hasher.signature(text)
+            self.signatures[key] = signature
+            for band_key in self._band_keys(signature, scope):
+                self.buckets.setdefault(band_key, []).append(key)
+    
+    def remove(self, text, key, scope=None):
+        """Forget text indexed under key, e.g. a question its page no longer has
+        
+        Does nothing for a key that was never indexed or is already gone.
+        """
+        removed = False
+        for table, digest in ((self.exact, exact_key(text)), (self.templates, template_fingerprint(text))):
+            if table.get((scope, digest)) == key:
+                del table[(scope, digest)]
+                removed = True
+        signature = self.signatures.pop(key, None)
+        if signature is not None:
+            removed = True
+            for band_key in self._band_keys(signature, scope):
+                bucket = self.buckets.get(band_key)
+                if bucket and key in bucket:
+                    bucket.remove(key)
+        if removed:
+            self.size -= 1
+    
+    def __len__(self):
+        return self.size
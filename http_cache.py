@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import time
+
+class ResponseCache:
+    def __init__(self, cache_dir="scraped_data/http_cache"):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + ".json", base + ".body"
+    
+    def _write(self, path, data, mode="w"):
+        """Write via a temp file so a crash never leaves half an entry behind"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    
+    def get(self, url):
+        """Return the cached entry for a URL (metadata plus "body"), or None"""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            with open(body_path, "r", encoding=entry.get("encoding") or "utf-8") as f:
+                entry["body"] = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        return entry
+    
+    def conditional_headers(self, url):
+        """Build If-None-Match / If-Modified-Since headers from the cached validators"""
+        meta_path, _ = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+    
+    def store(self, url, response):
+        """Save a 200 response body together with its validators"""
+        meta_path, body_path = self._paths(url)
+        encoding = response.encoding or "utf-8"
+        self._write(body_path, response.text.encode(encoding, errors="replace"), "wb")
+        self._write(meta_path, json.dumps({
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "encoding": encoding,
+            "fetched_at": time.time(),
+            "validated_at": time.time()
+        }))
+    
+    def mark_validated(self, url):
+        """Record that the server confirmed the cached copy is still current (a 304)"""
+        entry = self.get(url)
+        if entry is None:
+            return
+        entry.pop("body", None)
+        entry["validated_at"] = time.time()
+        meta_path, _ = self._paths(url)
+        self._write(meta_path, json.dumps(entry))
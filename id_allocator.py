@@ -0,0 +1,88 @@
+import datetime
+import os
+import threading
+import time
+
+# Crockford's base32 keeps IDs URL-safe and lexicographically sortable
+CROCKFORD_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+TIMESTAMP_LENGTH = 10
+RANDOM_LENGTH = 16
+RANDOM_BITS = 80
+
+def encode_base32(value, length):
+    """Encode a non-negative integer as a fixed-width Crockford base32 string"""
+    chars = []
+    for _ in range(length):
+        chars.append(CROCKFORD_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+def decode_base32(text):
+    """Decode a Crockford base32 string back into an integer"""
+    value = 0
+    for char in text:
+        value = (value << 5) | CROCKFORD_ALPHABET.index(char)
+    return value
+
+def is_ulid(text):
+    """Check whether a string looks like an ID suffix produced by IdAllocator"""
+    return (len(text) == TIMESTAMP_LENGTH + RANDOM_LENGTH and
+            all(char in CROCKFORD_ALPHABET for char in text))
+
+def ulid_lower_bound(when):
+    """Return the smallest ULID that could have been allocated at or after `when`"""
+    if isinstance(when, str):
+        when = datetime.datetime.strptime(when, "%Y%m%d%H%M%S")
+    millis = int(when.timestamp() * 1000)
+    return encode_base32(millis, TIMESTAMP_LENGTH) + "0" * RANDOM_LENGTH
+
+def ulid_datetime(ulid):
+    """Return the local time at which a ULID was allocated"""
+    return datetime.datetime.fromtimestamp(decode_base32(ulid[:TIMESTAMP_LENGTH]) / 1000)
+
+def variant_sort_key(question):
+    """Sortable generation key for a question, falling back to generated_on for old IDs"""
+    suffix = question.get("id", "").rsplit("_", 1)[-1]
+    if is_ulid(suffix):
+        return suffix
+    return ulid_lower_bound(question.get("generated_on", "19700101000000"))
+
+# ULID-style IDs: 48-bit millisecond time plus 80 random bits. IDs from one
+# process are strictly increasing, even within a millisecond, and the random
+# part keeps workers sharing a store from colliding.
+class IdAllocator:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            # A forked worker must not continue the parent's random sequence
+            os.register_at_fork(after_in_child=self._reset)
+    
+    def _reset(self):
+        self.lock = threading.Lock()
+        self._last_millis = -1
+        self._last_random = 0
+    
+    def new_ulid(self):
+        """Return a new 26 character ID that sorts after every earlier one"""
+        with self.lock:
+            millis = int(time.time() * 1000)
+            if millis <= self._last_millis:
+                # Same millisecond (or the clock stepped back): stay monotonic
+                millis = self._last_millis
+                random_part = self._last_random + 1
+                if random_part >> RANDOM_BITS:
+                    millis += 1
+                    random_part = int.from_bytes(os.urandom(RANDOM_BITS // 8), "big")
+            else:
+                random_part = int.from_bytes(os.urandom(RANDOM_BITS // 8), "big")
+            self._last_millis = millis
+            self._last_random = random_part
+        return encode_base32(millis, TIMESTAMP_LENGTH) + encode_base32(random_part, RANDOM_LENGTH)
+    
+    def allocate(self, original_id):
+        """Return a new ID for a question generated from original_id"""
+        return f"gen_{original_id}_{self.new_ulid()}"
+
+# Shared by every QuestionDatabase in the process so their IDs stay ordered
+default_allocator = IdAllocator()
@@ -0,0 +1,231 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from question import json_default, question_hook
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock (Windows) the locks only cover threads of one process
+    fcntl = None
+
+@contextmanager
+def file_lock(path, shared=False):
+    """Hold an advisory lock on path, created if needed, against other processes"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+class QuestionJournal:
+    # Several processes may append to one journal: every append and rotation
+    # holds an flock on journal_path + ".lock", and a process whose open file
+    # was rotated away by another one reopens the live path before writing
+    
+    def __init__(self, journal_path, fsync_every=32, fsync_interval=1.0):
+        self.journal_path = journal_path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.record_count = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._file = None
+        # (inode, offset) of the journal up to which read_new() has returned records
+        self._position = None
+    
+    def _locked(self, shared=False):
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return file_lock(self.journal_path + ".lock", shared)
+    
+    def _drop_rotated_file(self):
+        """Close the journal file if another process has rotated it away; caller holds both locks"""
+        if self._file is not None and _inode(self.journal_path) != os.fstat(self._file.fileno()).st_ino:
+            self._sync_locked()
+            self._file.close()
+            self._file = None
+            # Everything written to it has been folded into a snapshot by the other process
+            self.record_count = 0
+    
+    def _open(self):
+        """Open the journal file for appending, creating it if needed"""
+        self._drop_rotated_file()
+        if self._file is None:
+            directory = os.path.dirname(self.journal_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.journal_path, "a+", encoding="utf-8")
+            
+            # Terminate a partial line left by a crash so new records stay readable
+            if self._file.tell() > 0:
+                self._file.seek(self._file.tell() - 1)
+                if self._file.read(1) != "\n":
+                    self._file.write("\n")
+        return self._file
+    
+    def append(self, record):
+        """Append a single record as one JSON line, fsyncing in batches"""
+        self.append_many([record])
+    
+    def append_many(self, records):
+        """Append several records with a single write, returning the bytes written"""
+        data = "".join(json.dumps(record, separators=(",", ":"), default=json_default) + "\n"
+                       for record in records)
+        with self.lock, self._locked():
+            f = self._open()
+            f.write(data)
+            f.flush()
+            self.record_count += len(records)
+            self._unsynced += len(records)
+            
+            # Batch fsyncs so a burst of writes costs one disk flush
+            if (self._unsynced >= self.fsync_every or
+                    time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync_locked()
+        # json.dumps escapes non-ASCII, so characters and bytes are the same count
+        return len(data)
+    
+    def sync(self):
+        """Force any buffered records to disk"""
+        with self.lock:
+            self._sync_locked()
+    
+    def _sync_locked(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+    
+    def replay(self, path=None):
+        """Yield every complete record stored in the journal"""
+        path = path or self.journal_path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        # A crash mid-append leaves a partial last line; drop it
+                        print(f"Warning: Ignoring truncated record at end of {path}")
+                        break
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line, object_hook=question_hook)
+                    except ValueError:
+                        print(f"Warning: Skipping corrupt record in {path}")
+        except FileNotFoundError:
+            return
+    
+    def rotate(self):
+        """Move the live journal aside and start a fresh one, returning the old path
+        
+        Returns None when there is nothing to fold in: no live journal and none
+        left over from an interrupted compaction.
+        """
+        with self.lock, self._locked():
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            
+            rotated_path = self.journal_path + ".old"
+            if not os.path.exists(self.journal_path):
+                return rotated_path if os.path.exists(rotated_path) else None
+            
+            if os.path.exists(rotated_path):
+                # A previous compaction never finished; keep its records too
+                with open(self.journal_path, "rb") as src, open(rotated_path, "ab") as dst:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, rotated_path)
+            self.record_count = 0
+            return rotated_path
+    
+    def rewind(self):
+        """Make the next read_new() start again from the beginning of the journal
+        
+        A journal recreated after a rotation can reuse the old file's inode
+        number, so callers that learn of a rotation some other way call this.
+        """
+        with self.lock:
+            self._position = None
+    
+    def read_new(self):
+        """Return (records, rotated): complete records any process appended since the last call
+        
+        `rotated` is True on the first call and whenever the journal has been
+        rotated since the previous one; the records then also include any
+        journal left over from an interrupted compaction, and may repeat ones
+        returned before.
+        """
+        position = self._position
+        if position is not None:
+            try:
+                stat = os.stat(self.journal_path)
+                current = (stat.st_ino, stat.st_size)
+            except FileNotFoundError:
+                current = (None, 0)
+            if current == position:
+                # Nothing appended or rotated: one stat call and no lock
+                return [], False
+        
+        with self.lock, self._locked(shared=True):
+            try:
+                stat = os.stat(self.journal_path)
+                inode, size = stat.st_ino, stat.st_size
+            except FileNotFoundError:
+                inode, size = None, 0
+            # A shorter file under the same inode number is a new journal reusing it
+            rotated = position is None or position[0] != inode or size < position[1]
+            records = []
+            offset = 0
+            if rotated:
+                self._drop_rotated_file()
+                records.extend(self.replay(self.journal_path + ".old"))
+            else:
+                offset = position[1]
+            try:
+                with open(self.journal_path, "rb") as f:
+                    f.seek(offset)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            # Left by a crash mid-append; the next append terminates it
+                            break
+                        offset += len(line)
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            records.append(json.loads(line, object_hook=question_hook))
+                        except ValueError:
+                            print(f"Warning: Skipping corrupt record in {self.journal_path}")
+            except FileNotFoundError:
+                pass
+            self._position = (inode, offset)
+        return records, rotated
+    
+    def close(self):
+        """Flush and close the journal file"""
+        with self.lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,149 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds; the +Inf bucket is implicit
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+    
+    def __init__(self, name, help_text, labels=(), function=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        # Called on every scrape instead of storing values; returns a number, or a
+        # dict of label value tuples -> number, so nothing is computed in between
+        self.function = function
+        self.values = {}
+        self.lock = threading.Lock()
+    
+    def samples(self):
+        """Return (suffix, label values, extra label, value) tuples for the current values"""
+        if self.function is not None:
+            values = self.function()
+            if not isinstance(values, dict):
+                values = {(): values}
+        else:
+            with self.lock:
+                values = dict(self.values)
+        return [("", key if isinstance(key, tuple) else (key,), "", value)
+                for key, value in sorted(values.items())]
+    
+    def render(self):
+        """Render the metric in the Prometheus text exposition format"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labels, values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+    
+    def inc(self, *labels, amount=1):
+        """Add amount to the counter for these label values"""
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+    
+    def set(self, value, *labels):
+        """Set the gauge for these label values"""
+        with self.lock:
+            self.values[labels] = value
+    
+    def inc(self, *labels, amount=1):
+        """Add amount (which may be negative) to the gauge for these label values"""
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+class Histogram(Metric):
+    kind = "histogram"
+    
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value, *labels):
+        """Record one observation for these label values"""
+        # Per-bucket counts are kept non-cumulative so an observation touches one slot
+        slot = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][slot] += 1
+            state[1] += value
+            state[2] += 1
+    
+    @contextmanager
+    def time(self, *labels):
+        """Observe the wall-clock duration of the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+    
+    def samples(self):
+        with self.lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self.values.items()}
+        samples = []
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", key, f'le="{_format_value(float(bound))}"', cumulative))
+            samples.append(("_sum", key, "", total))
+            samples.append(("_count", key, "", count))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+    
+    def register(self, metric):
+        """Add a metric, or return the one already registered under its name"""
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+    
+    def render(self):
+        """Render every metric for a /metrics scrape"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name, help_text, labels=(), function=None):
+    """Create and register a counter"""
+    return REGISTRY.register(Counter(name, help_text, labels, function))
+
+def gauge(name, help_text, labels=(), function=None):
+    """Create and register a gauge"""
+    return REGISTRY.register(Gauge(name, help_text, labels, function))
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    """Create and register a histogram"""
+    return REGISTRY.register(Histogram(name, help_text, labels, buckets))
@@ -0,0 +1,85 @@
+import re
+import time
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+
+# lxml parses several times faster than the stdlib parser; use it when installed
+try:
+    import lxml
+    DEFAULT_PARSER = "lxml"
+except ImportError:
+    DEFAULT_PARSER = "html.parser"
+
+QUESTION_START_PATTERN = re.compile(r'^(\d+\.|\(?\d+\)|Question\s+\d+:)')
+
+# The functions below run in worker processes, so they take and return plain
+# picklable values and never touch scraper state
+
+def parse_madas_index(html, base_url, parser=DEFAULT_PARSER):
+    """Return (topic, url) pairs for the Further Maths links on the MadAsMaths index"""
+    soup = BeautifulSoup(html, parser)
+    fm_links = []
+    for link in soup.find_all('a', href=True):
+        if "FM_" in link['href'] or "further" in link['href'].lower():
+            fm_links.append((link.text.strip(), urljoin(base_url, link['href'])))
+    return fm_links
+
+def parse_pmt_index(html, base_url, parser=DEFAULT_PARSER):
+    """Return (topic, url) pairs for the Further Maths links on the PMT index"""
+    soup = BeautifulSoup(html, parser)
+    topic_links = []
+    main_content = soup.find('div', class_='main-content')
+    if main_content:
+        for link in main_content.find_all('a', href=True):
+            if "further-maths" in link['href']:
+                topic_links.append((link.text.strip(), urljoin(base_url, link['href'])))
+    return topic_links
+
+def parse_madas_topic(html, url, parser=DEFAULT_PARSER):
+    """Extract embedded questions and PDF links from a MadAsMaths topic page"""
+    soup = BeautifulSoup(html, parser)
+    questions = []
+    
+    # MadAsMaths often has numbered questions in divs or paragraphs
+    question_sections = soup.find_all(['div', 'p'], class_=lambda c: c and ('question' in c.lower() or 'problem' in c.lower()))
+    if not question_sections:
+        # Try finding questions by pattern (1. or Question 1:)
+        for i, p in enumerate(soup.find_all(['p', 'div'])):
+            text = p.get_text().strip()
+            if QUESTION_START_PATTERN.match(text):
+                questions.append((i, text))
+    
+    pdf_links = [urljoin(url, link['href']) for link in soup.find_all('a', href=True)
+                 if link['href'].endswith('.pdf')]
+    return {"questions": questions, "pdf_links": pdf_links}
+
+def parse_pmt_topic(html, url, parser=DEFAULT_PARSER):
+    """Extract (paper_url, paper_type) links from a PMT topic page"""
+    soup = BeautifulSoup(html, parser)
+    paper_links = []
+    resource_section = soup.find('div', class_=['resources', 'papers'])
+    if resource_section:
+        for link in resource_section.find_all('a', href=True):
+            if link['href'].endswith('.pdf'):
+                paper_url = urljoin(url, link['href'])
+                link_text = link.text.strip().lower()
+                if 'question' in link_text:
+                    paper_links.append((paper_url, 'question'))
+                elif 'mark' in link_text:
+                    paper_links.append((paper_url, 'mark scheme'))
+    return {"paper_links": paper_links}
+
+TOPIC_PARSERS = {
+    "madas": parse_madas_topic,
+    "pmt": parse_pmt_topic
+}
+
+def parse_topic_page(source, topic, url, html, parser=DEFAULT_PARSER):
+    """Parse a topic page from either source, returning (source, topic, url, result, seconds)
+
+    The parse time is measured in the worker and returned, as metrics recorded
+    in a pool process would never reach the scraper.
+    """
+    start = time.perf_counter()
+    result = TOPIC_PARSERS[source](html, url, parser)
+    return source, topic, url, result, time.perf_counter() - start
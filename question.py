@@ -0,0 +1,173 @@
+import copy
+import sys
+from collections.abc import Mapping, MutableMapping
+
+# Known question fields, in the order they are written out; anything else goes in `extra`
+FIELDS = ("id", "topic", "question_text", "mark_scheme", "total_marks", "source_url",
+          "seed", "modifier", "sampler", "generated", "original_id", "generated_on", "lazy")
+FIELD_INDEX = {key: i for i, key in enumerate(FIELDS)}
+# Values shared by many questions, kept as one string object per distinct value
+INTERNED_FIELDS = frozenset(("topic", "source_url", "original_id", "generated_on", "modifier", "sampler"))
+
+# Marks a known field the question does not have
+MISSING = object()
+_EMPTY = [MISSING] * len(FIELDS)
+# Slots every generated variant sets
+_TEXT, _MARK_SCHEME, _SEED, _MODIFIER, _SAMPLER = (
+    FIELD_INDEX[key] for key in ("question_text", "mark_scheme", "seed", "modifier", "sampler"))
+
+class Question(MutableMapping):
+    # Known fields live in one flat list, so a copy is a single list copy and no
+    # per-question dict repeats the key names; templates fall back to item lookup.
+    # `extra` may be shared between variants, so it is replaced rather than changed
+    __slots__ = ("_values", "extra")
+    
+    def __init__(self, data=None, **fields):
+        values = self._values = _EMPTY[:]
+        self.extra = None
+        # Runs once per question on load, so __setitem__ is inlined
+        for items in (data.items() if data else (), fields.items()):
+            for key, value in items:
+                i = FIELD_INDEX.get(key)
+                if i is None:
+                    if self.extra is None:
+                        self.extra = {}
+                    self.extra[key] = value
+                    continue
+                if key in INTERNED_FIELDS and value.__class__ is str:
+                    value = sys.intern(value)
+                values[i] = value
+    
+    def __getitem__(self, key):
+        i = FIELD_INDEX.get(key)
+        if i is not None:
+            value = self._values[i]
+            if value is not MISSING:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+    
+    def get(self, key, default=None):
+        """Return the value for key, or default when the question has no such field"""
+        i = FIELD_INDEX.get(key)
+        if i is not None:
+            value = self._values[i]
+            return default if value is MISSING else value
+        return self.extra.get(key, default) if self.extra is not None else default
+    
+    def __setitem__(self, key, value):
+        i = FIELD_INDEX.get(key)
+        if i is not None:
+            if key in INTERNED_FIELDS and value.__class__ is str:
+                value = sys.intern(value)
+            self._values[i] = value
+        else:
+            self.extra = {**self.extra, key: value} if self.extra else {key: value}
+    
+    def __delitem__(self, key):
+        i = FIELD_INDEX.get(key)
+        if i is not None:
+            if self._values[i] is MISSING:
+                raise KeyError(key)
+            self._values[i] = MISSING
+        elif self.extra is not None and key in self.extra:
+            self.extra = {k: v for k, v in self.extra.items() if k != key} or None
+        else:
+            raise KeyError(key)
+    
+    def __contains__(self, key):
+        i = FIELD_INDEX.get(key)
+        if i is not None:
+            return self._values[i] is not MISSING
+        return self.extra is not None and key in self.extra
+    
+    def __iter__(self):
+        for key, value in zip(FIELDS, self._values):
+            if value is not MISSING:
+                yield key
+        if self.extra:
+            yield from list(self.extra)
+    
+    def __len__(self):
+        return len(FIELDS) - self._values.count(MISSING) + len(self.extra or ())
+    
+    def to_dict(self):
+        """Return the question as a plain dict, as stored in question_database.json"""
+        data = {key: value for key, value in zip(FIELDS, self._values) if value is not MISSING}
+        if self.extra:
+            data.update(self.extra)
+        return data
+    
+    def copy(self):
+        """Return a copy that shares its field values with this question
+        
+        Field values are strings and numbers, so sharing them is safe and a
+        variant only pays for the fields it replaces. Unknown fields may hold
+        mutable values and are deep-copied, as modifiers used to copy everything.
+        """
+        clone = Question.__new__(Question)
+        clone._values = self._values[:]
+        clone.extra = copy.deepcopy(self.extra) if self.extra else None
+        return clone
+    
+    def variants(self, texts, mark_schemes, seeds, modifier, sampler):
+        """Return one generated copy per (text, mark scheme, seed), for the batch engine
+        
+        The modifier and sampler are set once on a template list, so each variant
+        is one list copy and three slot stores. Unknown fields are shared with
+        this question rather than deep-copied; they are never changed in place.
+        """
+        template = self._values[:]
+        template[_MODIFIER] = sys.intern(modifier) if modifier.__class__ is str else modifier
+        template[_SAMPLER] = sys.intern(sampler) if sampler.__class__ is str else sampler
+        extra = self.extra or None
+        new = Question.__new__
+        result = []
+        for text, mark_scheme, seed in zip(texts, mark_schemes, seeds):
+            values = template[:]
+            values[_TEXT] = text
+            values[_MARK_SCHEME] = mark_scheme
+            values[_SEED] = seed
+            variant = new(Question)
+            variant._values = values
+            variant.extra = extra
+            result.append(variant)
+        return result
+    
+    def __copy__(self):
+        return self.copy()
+    
+    def __reduce__(self):
+        # Rebuilt from a dict so pickles and deep copies never carry the MISSING marker
+        return Question, (self.to_dict(),)
+    
+    def __eq__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return self.to_dict() == dict(other.items())
+    
+    def __repr__(self):
+        return f"Question({self.to_dict()!r})"
+
+def as_question(question):
+    """Return a stored or loaded question as a Question record; None passes through"""
+    if question is None or isinstance(question, Question):
+        return question
+    return Question(question)
+
+def question_hook(data):
+    """json object_hook that builds Question records as a bank is parsed, so no per-question dict is kept"""
+    if "id" in data and "topic" in data:
+        return Question(data)
+    return data
+
+def copy_question(question):
+    """Copy a question (Question or plain dict) for a modifier to change"""
+    return as_question(question).copy()
+
+def json_default(value):
+    """`default` hook for json.dump(s) that writes Question records as JSON objects"""
+    if isinstance(value, Question):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
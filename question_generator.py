@@ -1,29 +1,108 @@
-from question_modifier import QuestionModifier
+import random
+from question_modifier import QuestionModifier, new_seed
+
+# Variants generated per vectorised pass when streaming a large batch
+BATCH_CHUNK_SIZE = 1000
 
 class QuestionGenerator:
-    def __init__(self):
-        self.modifier = QuestionModifier()
+    def __init__(self, store=None):
+        self.modifier = QuestionModifier(store=store)
+        self._batch = None
+    
+    @property
+    def batch(self):
+        if self._batch is None:
+            # Imported on first use so NumPy stays out of cold starts
+            from batch_modifier import BatchModifier
+            self._batch = BatchModifier(self.modifier)
+        return self._batch
         
     def get_topics(self):
         """Get list of available topics"""
         return self.modifier.get_topics()
         
-    def generate_by_topic(self, topic):
+    def generate_by_topic(self, topic, seed=None):
         """Generate a new question for a specific topic"""
-        return self.modifier.create_modified_question(topic=topic)
+        return self.modifier.create_modified_question(topic=topic, seed=seed)
         
-    def generate_by_id(self, question_id):
+    def generate_by_id(self, question_id, seed=None):
         """Generate a new question based on a specific question ID"""
-        return self.modifier.create_modified_question(original_id=question_id)
+        return self.modifier.create_modified_question(original_id=question_id, seed=seed)
+        
+    def generate_batch(self, items):
+        """Yield (original_id, question) for each requested variant
+        
+        Each item is a dict with either a "question_id" or a "topic", an
+        optional "count" (default 1) and an optional "seed"; variant k of a
+        seeded item uses seed + k. Items that cannot be generated yield
+        (None, None) for each missing variant. Variants are generated in
+        vectorised chunks and are identical to generating them one at a time.
+        """
+        for item in items:
+            count = item.get("count", 1)
+            for start in range(0, count, BATCH_CHUNK_SIZE):
+                ks = range(start, min(count, start + BATCH_CHUNK_SIZE))
+                if item.get("seed") is not None:
+                    seeds = [item["seed"] + k for k in ks]
+                else:
+                    seeds = [new_seed() for _ in ks]
+                
+                for question in self._generate_chunk(item, seeds):
+                    if question is None:
+                        yield None, None
+                    else:
+                        # The modified copy still carries the ID of the question it came from
+                        yield question["id"], question
+    
+    def generate_variants(self, question_id, seeds=None, count=None):
+        """Generate a variant of a question for each seed (or `count` fresh seeds) in one pass"""
+        question, _ = self.modifier.store.get_question_by_id(question_id)
+        question = self.resolve_question(question)
+        if question is None:
+            print(f"Question with ID {question_id} not found")
+            return None
+        return self.batch.modify_batch(question, seeds, count)
+    
+    def _generate_chunk(self, item, seeds):
+        if item.get("question_id"):
+            return self.generate_variants(item["question_id"], seeds) or [None] * len(seeds)
+        
+        if not item.get("topic"):
+            return [self.generate_by_topic(None, seed) for seed in seeds]
+        
+        questions = self.modifier.get_questions_by_topic(item["topic"])
+        if not questions:
+            print(f"No questions found for topic: {item['topic']}")
+            return [None] * len(seeds)
+        
+        # Pick each seed's question exactly as create_modified_question does,
+        # then generate the variants of each picked question together
+        groups = {}
+        for i, seed in enumerate(seeds):
+            question = random.Random(seed).choice(questions)
+            groups.setdefault(question["id"], (question, []))[1].append(i)
         
+        variants = [None] * len(seeds)
+        for question, indexes in groups.values():
+            batch = self.batch.modify_batch(self.resolve_question(question), [seeds[i] for i in indexes])
+            for i, variant in zip(indexes, batch):
+                variants[i] = variant
+        return variants
+    
     def get_question_by_id(self, question_id):
         """Retrieve a specific question by ID"""
-        for topic in self.get_topics():
-            for question in self.modifier.get_questions_by_topic(topic):
-                if question.get("id") == question_id:
-                    return question
-        return None
+        question, _ = self.modifier.store.get_question_by_id(question_id)
+        return self.resolve_question(question)
+    
+    def resolve_question(self, question):
+        """Render a lazily stored variant, returning other questions unchanged"""
+        return self.modifier.resolve_question(question)
         
+    def get_topic_page(self, topic, cursor=None, limit=20, kind=None):
+        """Get one page of a topic's questions and the cursor for the next page"""
+        questions, next_cursor = self.modifier.store.page_topic(topic, cursor, limit, kind)
+        return [self.resolve_question(q) for q in questions], next_cursor
+    
     def get_questions_by_topic(self, topic):
         """Get all questions for a specific topic"""
-        return self.modifier.get_questions_by_topic(topic)
+        return [self.resolve_question(q) for q in self.modifier.get_questions_by_topic(topic)]
@@ -2,57 +2,229 @@ import json
 import os
 import random
 import re
-import copy
 import math
-import sympy as sp
+import threading
+import time
+from collections import OrderedDict
+from fractions import Fraction
+from question_store import QuestionStore
+from question import copy_question, question_hook
+from sqlite_store import SQLiteQuestionStore, SQLITE_EXTENSIONS
+from snapshot import SnapshotQuestionStore, SNAPSHOT_EXTENSIONS
+from counter_rng import SPLITMIX_SAMPLER, LEGACY_SAMPLER, make_rng
+from symbolic import default_solver, root_text
+from metrics import histogram
+
+# Patterns are compiled once at import and shared by every modifier
+NUMBER_PATTERN = re.compile(r'[-+]?\d*\.\d+|\d+')
+COMPLEX_NUMBER_PATTERN = re.compile(r'z\s*=\s*([-+]?\d+)\s*([-+])\s*(\d+)i')
+MATRIX_PATTERN = re.compile(r'A\s*=\s*\[\[(.*?)\],\s*\[(.*?)\]\]')
+DIFFERENTIAL_EQUATION_PATTERN = re.compile(r'dy/dx\s*\+\s*(\d+)y\s*=\s*(\d+)e\^\((-?\d+)x\)')
+INITIAL_CONDITION_PATTERN = re.compile(r'y\s*=\s*(\d+)\s*when\s*x\s*=\s*(\d+)')
+CUBIC_PATTERN = re.compile(r'z\^3\s*\+\s*(\d+)z\s*\+\s*(\d+)\s*=\s*0')
+
+MODIFIER_SECONDS = histogram("modifier_duration_seconds", "Time taken to generate one variant, by modifier",
+                             ["modifier"])
+
+# Bounded so the batch engine can mask a fixed number of resamples
+MAX_DETERMINANT_RESAMPLES = 16
+
+# (k, r, x0, y0) -> verified DE mark scheme text; parameters come from small
+# ranges, so a process sees a few hundred distinct sets
+_DE_MARK_SCHEMES = {}
+DE_MARK_SCHEME_CACHE_SIZE = 4096
+
+# (topic key, compiled pattern or None, handler) in registration order
+MODIFIER_REGISTRY = []
+# handler name -> (compiled pattern or None, handler), used to re-render stored variants
+MODIFIERS_BY_NAME = {}
+_TOPIC_DISPATCH_CACHE = {}
+
+def register_modifier(topic, pattern=None):
+    """Register a handler for questions whose topic contains `topic`
+    
+    If a pattern is given the handler only runs when it matches the question
+    text, and receives the match so it can substitute without searching again.
+    Handlers are called as handler(modifier, question, match, rng), where rng
+    is the random number generator for this generation (see counter_rng).
+    """
+    def decorator(handler):
+        MODIFIER_REGISTRY.append((topic, pattern, handler))
+        MODIFIERS_BY_NAME[handler.__name__] = (pattern, handler)
+        _TOPIC_DISPATCH_CACHE.clear()
+        return handler
+    return decorator
+
+def new_seed():
+    """Draw a fresh seed for a generation that was not given one"""
+    return random.getrandbits(32)
+
+def replace_match(text, match, replacement):
+    """Substitute the span of an existing match without re-running the pattern"""
+    return text[:match.start()] + replacement + text[match.end():]
+
+def sample_non_singular(rng):
+    """Draw a 2x2 matrix with entries in [-5, 5] and non-zero determinant"""
+    a = rng.randint(-5, 5)
+    b = rng.randint(-5, 5)
+    c = rng.randint(-5, 5)
+    d = rng.randint(-5, 5)
+    
+    # Resampling d alone never ends when a = 0 and bc = 0, so redraw a and d together
+    resamples = 0
+    while a*d - b*c == 0:
+        if resamples == MAX_DETERMINANT_RESAMPLES:
+            # Practically unreachable; any fixed non-singular choice will do
+            return 1, b, c, (1 if b*c != 1 else -1)
+        a = rng.randint(-5, 5)
+        d = rng.randint(-5, 5)
+        resamples += 1
+    return a, b, c, d
+
+def exp_text(coeff, power):
+    """Render coeff·e^(power) as SymPy's mark scheme output does, e.g. 5e^(6), 3e, e"""
+    return f"{'' if coeff == 1 else coeff}e{'' if power == 1 else f'^({power})'}"
+
+def differential_equation_mark_scheme(k, r, x0, y0, solver=default_solver):
+    """Mark scheme for dy/dx + ky = re^(-kx) with y = y0 when x = x0
+    
+    The constant of integration comes from the symbolic solver; if it does
+    not answer in time the same value is written out from C = y0e^(kx0) - rx0.
+    Texts built from a solver answer are memoised, so the batch engine's
+    distinct rows cost a dict lookup rather than a round-trip to the solver.
+    """
+    key = (k, r, x0, y0)
+    if solver is default_solver:
+        text = _DE_MARK_SCHEMES.get(key)
+        if text is not None:
+            return text
+    result = solver.solve("linear_de", k, r, x0, y0)
+    solved = result is not None
+    if result is None:
+        if x0 == 0 or y0 == 0:
+            result = {"C": str(y0 - r * x0), "C_is_integer": True}
+        else:
+            result = {"C": f"{exp_text(y0, k * x0)} - {r * x0}", "C_is_integer": False}
+    C = result["C"]
+    if x0 == 0:
+        substituted = f"When x = 0, y = {y0}, so {y0} = 0 + C, therefore C = {C}"
+    elif y0 == 0:
+        substituted = f"When x = {x0}, y = 0, so 0 = {r * x0} + C, therefore C = {C}"
+    else:
+        substituted = f"When x = {x0}, y = {y0}, so {exp_text(y0, k * x0)} = {r * x0} + C, therefore C = {C}"
+    # A negative integer C is written as a subtraction, e.g. (2x - 4) rather than (2x + -4)
+    if result["C_is_integer"] and C.startswith("-"):
+        sign, coefficient, constant = "-", C[1:], C[1:]
+    else:
+        sign, coefficient, constant = "+", C if result["C_is_integer"] else f"({C})", C
+    text = (
+        f"Using integrating factor e^(∫{k}dx) = e^({k}x)\n"
+        f"e^({k}x)dy/dx + {k}e^({k}x)y = {r}\n"
+        f"d/dx(e^({k}x)y) = {r}\n"
+        f"e^({k}x)y = {r}x + C\n"
+        f"{substituted}\n"
+        f"y = {r}xe^({-k}x) {sign} {coefficient}e^({-k}x) = e^({-k}x)({r}x {sign} {constant})"
+    )
+    if solved and solver is default_solver and len(_DE_MARK_SCHEMES) < DE_MARK_SCHEME_CACHE_SIZE:
+        _DE_MARK_SCHEMES[key] = text
+    return text
+
+def matrix_inverse(a, b, c, d, solver=default_solver):
+    """Return (det, inverse entries as strings) for a non-singular 2x2 matrix"""
+    result = solver.solve("inverse", a, b, c, d)
+    if result is not None:
+        return result["det"], result["inverse"]
+    det = a*d - b*c
+    return det, [[str(Fraction(d, det)), str(Fraction(-b, det))],
+                 [str(Fraction(-c, det)), str(Fraction(a, det))]]
+
+def depressed_cubic_roots(a, b, solver=default_solver):
+    """Return the roots of z^3 + az + b = 0 (a > 0) as strings, real root first
+    
+    The symbolic solver finds them numerically; if it does not answer in time
+    the same values are written out from Cardano's formula, the real root
+    polished with Newton's method and the conjugate pair from z^2 + xz + x^2 + a.
+    """
+    result = solver.solve("roots", 1, 0, a, b)
+    if result is not None:
+        return result["roots"]
+    half = b / 2
+    disc = math.sqrt(half * half + (a / 3) ** 3)
+    x = math.copysign(abs(disc - half) ** (1 / 3), disc - half) - (half + disc) ** (1 / 3)
+    for _ in range(3):
+        x -= (x**3 + a*x + b) / (3*x*x + a)
+    im_part = math.sqrt(0.75 * x * x + a)
+    # Listed as nroots orders them: the real root, then the pair by imaginary part
+    return [root_text(x, 0.0), root_text(-x / 2, -im_part), root_text(-x / 2, im_part)]
 
 class QuestionModifier:
-    def __init__(self, database_path="scraped_data/question_database.json"):
+    def __init__(self, database_path="scraped_data/question_database.json", store=None,
+                 variant_cache_size=1024):
         self.database_path = database_path
-        self.questions_db = self.load_database()
+        # LRU of rendered lazy variants, keyed by variant ID
+        self.variant_cache = OrderedDict()
+        self.variant_cache_size = variant_cache_size
+        self.variant_cache_lock = threading.Lock()
+        if store is None and database_path.endswith(SQLITE_EXTENSIONS):
+            store = SQLiteQuestionStore(database_path)
+        if store is None and database_path.endswith(SNAPSHOT_EXTENSIONS):
+            store = SnapshotQuestionStore(database_path)
+        if store is None:
+            store = QuestionStore(self.load_database())
+        elif not store.get_topics():
+            # Share the caller's store, seeding it if the database file was missing
+            store.load(self.sample_database())
+        self.store = store
+    
+    @property
+    def questions_db(self):
+        return self.store.questions_db
         
     def load_database(self):
         """Load the question database from JSON file"""
         try:
             with open(self.database_path, "r") as f:
-                return json.load(f)
+                return json.load(f, object_hook=question_hook)
         except FileNotFoundError:
             print(f"Warning: Database file not found at {self.database_path}")
-            # Create a sample database with common further maths topics
-            return {
-                "Complex Numbers": [
-                    {
-                        "id": "sample_complex_1",
-                        "topic": "Complex Numbers",
-                        "question_text": "Find the modulus and argument of the complex number z = 3 + 4i.",
-                        "mark_scheme": "|z| = √(3² + 4²) = √25 = 5\narg(z) = tan⁻¹(4/3) = 0.9273 radians = 53.13°",
-                        "total_marks": 3
-                    }
-                ],
-                "Matrices": [
-                    {
-                        "id": "sample_matrices_1",
-                        "topic": "Matrices",
-                        "question_text": "Find the determinant of the matrix A = [[2, 1], [3, 4]].",
-                        "mark_scheme": "det(A) = 2×4 - 1×3 = 8 - 3 = 5",
-                        "total_marks": 2
-                    }
-                ],
-                "Further Calculus": [
-                    {
-                        "id": "sample_calculus_1",
-                        "topic": "Further Calculus",
-                        "question_text": "Solve the differential equation dy/dx + 2y = 3e^(-2x), given that y = 1 when x = 0.",
-                        "mark_scheme": "Using integrating factor e^(∫2dx) = e^(2x)\ne^(2x)dy/dx + 2e^(2x)y = 3\nd/dx(e^(2x)y) = 3\ne^(2x)y = 3x + C\ny = 3xe^(-2x) + Ce^(-2x)\nWhen x = 0, y = 1, so 1 = 0 + C, therefore C = 1\ny = 3xe^(-2x) + e^(-2x) = e^(-2x)(3x + 1)",
-                        "total_marks": 6
-                    }
-                ]
-            }
+            return self.sample_database()
+    
+    def sample_database(self):
+        """Create a sample database with common further maths topics"""
+        return {
+            "Complex Numbers": [
+                {
+                    "id": "sample_complex_1",
+                    "topic": "Complex Numbers",
+                    "question_text": "Find the modulus and argument of the complex number z = 3 + 4i.",
+                    "mark_scheme": "|z| = √(3² + 4²) = √25 = 5\narg(z) = tan⁻¹(4/3) = 0.9273 radians = 53.13°",
+                    "total_marks": 3
+                }
+            ],
+            "Matrices": [
+                {
+                    "id": "sample_matrices_1",
+                    "topic": "Matrices",
+                    "question_text": "Find the determinant of the matrix A = [[2, 1], [3, 4]].",
+                    "mark_scheme": "det(A) = 2×4 - 1×3 = 8 - 3 = 5",
+                    "total_marks": 2
+                }
+            ],
+            "Further Calculus": [
+                {
+                    "id": "sample_calculus_1",
+                    "topic": "Further Calculus",
+                    "question_text": "Solve the differential equation dy/dx + 2y = 3e^(-2x), given that y = 1 when x = 0.",
+                    "mark_scheme": "Using integrating factor e^(∫2dx) = e^(2x)\ne^(2x)dy/dx + 2e^(2x)y = 3\nd/dx(e^(2x)y) = 3\ne^(2x)y = 3x + C\ny = 3xe^(-2x) + Ce^(-2x)\nWhen x = 0, y = 1, so 1 = 0 + C, therefore C = 1\ny = 3xe^(-2x) + e^(-2x) = e^(-2x)(3x + 1)",
+                    "total_marks": 6
+                }
+            ]
+        }
     
     def extract_numerical_values(self, text):
         """Extract numerical values from text, ignoring common markers"""
         # Find all numbers in the text
-        numbers = re.findall(r'[-+]?\d*\.\d+|\d+', text)
+        numbers = NUMBER_PATTERN.findall(text)
         # Convert to appropriate type (int or float)
         values = []
         for num in numbers:
@@ -62,191 +234,298 @@ class QuestionModifier:
                 values.append(int(num))
         return values
     
-    def modify_complex_number_question(self, question):
+    @register_modifier("Complex Numbers", COMPLEX_NUMBER_PATTERN)
+    def modify_complex_number_question(self, question, match, rng):
         """Modify a complex number question"""
-        modified = copy.deepcopy(question)
+        modified = copy_question(question)
         
         # Extract real and imaginary parts from question
-        match = re.search(r'z\s*=\s*([-+]?\d+)\s*([-+])\s*(\d+)i', question["question_text"])
-        if match:
-            real_part = int(match.group(1))
-            sign = match.group(2)
-            imag_part = int(match.group(3))
+        real_part = int(match.group(1))
+        sign = match.group(2)
+        imag_part = int(match.group(3))
             
-            # Generate new values
-            new_real = random.randint(1, 8) * (1 if random.random() > 0.5 else -1)
-            new_imag = random.randint(1, 8) * (1 if random.random() > 0.5 else -1)
-            new_sign = "+" if new_imag >= 0 else ""
+        # Generate new values
+        new_real = rng.randint(1, 8) * (1 if rng.random() > 0.5 else -1)
+        new_imag = rng.randint(1, 8) * (1 if rng.random() > 0.5 else -1)
+        new_sign = "+" if new_imag >= 0 else "-"
             
-            # Update question
-            modified["question_text"] = re.sub(
-                r'z\s*=\s*([-+]?\d+)\s*([-+])\s*(\d+)i',
-                f'z = {new_real} {new_sign} {abs(new_imag)}i',
-                question["question_text"]
-            )
+        # Update question
+        modified["question_text"] = replace_match(
+            question["question_text"], match, f'z = {new_real} {new_sign} {abs(new_imag)}i'
+        )
             
-            # Update mark scheme
-            modulus = math.sqrt(new_real**2 + new_imag**2)
-            argument = math.atan2(new_imag, new_real)
-            degrees = argument * 180 / math.pi
+        # Update mark scheme
+        modulus = math.sqrt(new_real**2 + new_imag**2)
+        argument = math.atan2(new_imag, new_real)
+        degrees = argument * 180 / math.pi
             
-            modified["mark_scheme"] = (
-                f"|z| = √({new_real}² + {abs(new_imag)}²) = √{new_real**2 + new_imag**2} = {modulus:.2f}\n"
-                f"arg(z) = tan⁻¹({new_imag}/{new_real}) = {argument:.4f} radians = {degrees:.2f}°"
-            )
+        modified["mark_scheme"] = (
+            f"|z| = √({new_real}² + {abs(new_imag)}²) = √{new_real**2 + new_imag**2} = {modulus:.2f}\n"
+            f"arg(z) = tan⁻¹({new_imag}/{new_real}) = {argument:.4f} radians = {degrees:.2f}°"
+        )
             
         return modified
     
-    def modify_matrix_question(self, question):
+    @register_modifier("Matrices", MATRIX_PATTERN)
+    def modify_matrix_question(self, question, match, rng):
         """Modify a matrix-related question"""
-        modified = copy.deepcopy(question)
+        modified = copy_question(question)
+        
+        text = question["question_text"].lower()
         
         # Check if it's a determinant question
-        if "determinant" in question["question_text"].lower():
-            # Extract matrix values if possible
-            matrix_match = re.search(r'A\s*=\s*\[\[(.*?)\],\s*\[(.*?)\]\]', question["question_text"])
-            if matrix_match:
-                # Generate new 2x2 matrix with values between -5 and 5
-                a = random.randint(-5, 5)
-                b = random.randint(-5, 5)
-                c = random.randint(-5, 5)
-                d = random.randint(-5, 5)
+        if "determinant" in text:
+            # Generate new 2x2 matrix with values between -5 and 5
+            a, b, c, d = sample_non_singular(rng)
                 
-                # Ensure determinant isn't zero
-                while a*d - b*c == 0:
-                    d = random.randint(-5, 5)
-                
-                # Update question
-                modified["question_text"] = re.sub(
-                    r'A\s*=\s*\[\[(.*?)\],\s*\[(.*?)\]\]',
-                    f'A = [[{a}, {b}], [{c}, {d}]]',
-                    question["question_text"]
-                )
+            # Update question
+            modified["question_text"] = replace_match(
+                question["question_text"], match, f'A = [[{a}, {b}], [{c}, {d}]]'
+            )
                 
-                # Update mark scheme
-                det = a*d - b*c
-                modified["mark_scheme"] = f"det(A) = {a}×{d} - {b}×{c} = {a*d} - {b*c} = {det}"
+            # Update mark scheme
+            det = a*d - b*c
+            modified["mark_scheme"] = f"det(A) = {a}×{d} - {b}×{c} = {a*d} - {b*c} = {det}"
+        
+        elif "inverse" in text or "a^-1" in text or "a⁻¹" in text:
+            a, b, c, d = sample_non_singular(rng)
+            modified["question_text"] = replace_match(
+                question["question_text"], match, f'A = [[{a}, {b}], [{c}, {d}]]'
+            )
+            
+            det, inverse = matrix_inverse(a, b, c, d)
+            modified["mark_scheme"] = (
+                f"det(A) = {a}×{d} - {b}×{c} = {det}\n"
+                f"A⁻¹ = (1/{det})[[{d}, {-b}], [{-c}, {a}]]"
+                f" = [[{inverse[0][0]}, {inverse[0][1]}], [{inverse[1][0]}, {inverse[1][1]}]]"
+            )
+        
+        elif "singular" in text:
+            # Singular matrices are allowed here, so no resampling
+            a = rng.randint(-5, 5)
+            b = rng.randint(-5, 5)
+            c = rng.randint(-5, 5)
+            d = rng.randint(-5, 5)
+            modified["question_text"] = replace_match(
+                question["question_text"], match, f'A = [[{a}, {b}], [{c}, {d}]]'
+            )
+            
+            result = default_solver.solve("det", a, b, c, d)
+            det = a*d - b*c if result is None else result["det"]
+            modified["mark_scheme"] = (
+                f"det(A) = {a}×{d} - {b}×{c} = {det}, "
+                f"so A is {'singular' if det == 0 else 'non-singular'}"
+            )
         
         return modified
     
-    def modify_differential_equation(self, question):
+    @register_modifier("Calculus", DIFFERENTIAL_EQUATION_PATTERN)
+    def modify_differential_equation(self, question, match, rng):
         """Modify a differential equation question"""
-        modified = copy.deepcopy(question)
+        modified = copy_question(question)
         
-        # Check if it's a first-order linear DE
-        if "dy/dx" in question["question_text"] and "=" in question["question_text"]:
-            # Try to extract the coefficient and right-hand side
-            de_match = re.search(r'dy/dx\s*\+\s*(\d+)y\s*=\s*(\d+)e\^\((-?\d+)x\)', question["question_text"])
-            if de_match:
-                coeff = int(de_match.group(1))
-                rhs_coeff = int(de_match.group(2))
-                exp_coeff = int(de_match.group(3))
+        # Only first-order linear DEs of the form dy/dx + ky = re^(mx) reach here
+        coeff = int(match.group(1))
+        rhs_coeff = int(match.group(2))
+        exp_coeff = int(match.group(3))
                 
-                # Generate new coefficients
-                new_coeff = random.choice([1, 2, 3, 4])
-                new_rhs_coeff = random.choice([2, 3, 4, 5])
-                new_exp_coeff = -new_coeff  # To maintain solvability
+        # Generate new coefficients
+        new_coeff = rng.choice([1, 2, 3, 4])
+        new_rhs_coeff = rng.choice([2, 3, 4, 5])
+        new_exp_coeff = -new_coeff  # To maintain solvability
                 
-                # Update question
-                modified["question_text"] = re.sub(
-                    r'dy/dx\s*\+\s*(\d+)y\s*=\s*(\d+)e\^\((-?\d+)x\)',
-                    f'dy/dx + {new_coeff}y = {new_rhs_coeff}e^({new_exp_coeff}x)',
-                    question["question_text"]
+        # Update question
+        modified["question_text"] = replace_match(
+            question["question_text"], match,
+            f'dy/dx + {new_coeff}y = {new_rhs_coeff}e^({new_exp_coeff}x)'
+        )
+        
+        # Extract initial condition if present
+        initial_match = INITIAL_CONDITION_PATTERN.search(modified["question_text"])
+        initial_y = 1
+        initial_x = 0
+        if initial_match:
+            initial_y = int(initial_match.group(1))
+            initial_x = int(initial_match.group(2))
+            
+            # Maybe modify initial condition
+            if rng.random() > 0.5:
+                initial_y = rng.choice([1, 2, 3, 4, 5])
+                modified["question_text"] = replace_match(
+                    modified["question_text"], initial_match, f'y = {initial_y} when x = {initial_x}'
                 )
                 
-                # Extract initial condition if present
-                initial_match = re.search(r'y\s*=\s*(\d+)\s*when\s*x\s*=\s*(\d+)', question["question_text"])
-                initial_y = 1
-                initial_x = 0
-                if initial_match:
-                    initial_y = int(initial_match.group(1))
-                    initial_x = int(initial_match.group(2))
+        # Update mark scheme; y(x0) = y0 gives C = y0e^(kx0) - rx0
+        modified["mark_scheme"] = differential_equation_mark_scheme(
+            new_coeff, new_rhs_coeff, initial_x, initial_y
+        )
                     
-                    # Maybe modify initial condition
-                    if random.random() > 0.5:
-                        initial_y = random.choice([1, 2, 3, 4, 5])
-                        modified["question_text"] = re.sub(
-                            r'y\s*=\s*(\d+)\s*when\s*x\s*=\s*(\d+)',
-                            f'y = {initial_y} when x = {initial_x}',
-                            modified["question_text"]
-                        )
-                
-                # Update mark scheme (simplified for brevity)
-                C = initial_y
-                if new_exp_coeff == -new_coeff:
-                    C = initial_y - (new_rhs_coeff * initial_x)
-                
-                modified["mark_scheme"] = (
-                    f"Using integrating factor e^(∫{new_coeff}dx) = e^({new_coeff}x)\n"
-                    f"e^({new_coeff}x)dy/dx + {new_coeff}e^({new_coeff}x)y = {new_rhs_coeff}\n"
-                    f"d/dx(e^({new_coeff}x)y) = {new_rhs_coeff}\n"
-                    f"e^({new_coeff}x)y = {new_rhs_coeff}x + C\n"
-                    f"When x = {initial_x}, y = {initial_y}, so {initial_y} = {0 if initial_x == 0 else new_rhs_coeff*initial_x} + C, therefore C = {C}\n"
-                    f"y = {new_rhs_coeff}xe^({new_exp_coeff}x) + {C}e^({new_exp_coeff}x) = e^({new_exp_coeff}x)({new_rhs_coeff}x + {C})"
-                )
+        return modified
+    
+    @register_modifier("Complex Numbers", CUBIC_PATTERN)
+    def modify_cubic_equation(self, question, match, rng):
+        """Modify a cubic z^3 + az + b = 0 and list its roots"""
+        modified = copy_question(question)
+        
+        a = rng.randint(1, 10)
+        b = rng.randint(1, 10)
+        modified["question_text"] = replace_match(
+            question["question_text"], match, f'z^3 + {a}z + {b} = 0'
+        )
+        
+        # With a, b > 0 the cubic is strictly increasing: one real root and a conjugate pair
+        roots = ", ".join(f"z = {root}" for root in depressed_cubic_roots(a, b))
+        modified["mark_scheme"] = (
+            f"f'(z) = 3z² + {a} > 0, so there is one real root and a complex conjugate pair\n"
+            f"Sum of roots = 0, sum of products in pairs = {a}, product of roots = {-b}\n"
+            f"Roots: {roots}"
+        )
         
         return modified
     
-    def modify_question(self, question):
-        """Modify a question based on its topic"""
-        topic = question["topic"]
+    def modify_generic_question(self, question, rng):
+        """Perform a simple modification by scaling the numerical values"""
+        modified = copy_question(question)
+        
+        # Create new values (±20% of original) for each number, in one pass over the text
+        replaced = []
+        def scale(number_match):
+            num = number_match.group(0)
+            val = float(num) if '.' in num else int(num)
+            new_val = round(val * rng.uniform(0.8, 1.2), 2)
+            replaced.append(new_val)
+            return str(new_val)
+        
+        new_text = NUMBER_PATTERN.sub(scale, question["question_text"])
         
-        if "Complex Numbers" in topic:
-            return self.modify_complex_number_question(question)
-        elif "Matrices" in topic:
-            return self.modify_matrix_question(question)
-        elif "Calculus" in topic:
-            return self.modify_differential_equation(question)
+        if replaced:
+            modified["question_text"] = new_text
+            
+            # Note: In a real implementation, you would need to also update the mark scheme
+            # This would require more sophisticated understanding of the mathematical context
+            modified["mark_scheme"] += "\n[Mark scheme would need to be updated with new values]"
+        
+        return modified
+    
+    def get_modifiers(self, topic):
+        """Return the registered (pattern, handler) pairs that apply to a topic"""
+        handlers = _TOPIC_DISPATCH_CACHE.get(topic)
+        if handlers is None:
+            handlers = [
+                (pattern, handler) for key, pattern, handler in MODIFIER_REGISTRY
+                if key in topic
+            ]
+            _TOPIC_DISPATCH_CACHE[topic] = handlers
+        return handlers
+    
+    def modify_question(self, question, seed=None, modifier=None, sampler=SPLITMIX_SAMPLER):
+        """Modify a question based on its topic
+        
+        The same question, seed and sampler always produce the same variant;
+        all three and the name of the handler used are recorded on the returned
+        question. Passing that name back as `modifier` forces the same handler again.
+        """
+        if seed is None:
+            seed = new_seed()
+        start = time.perf_counter()
+        modified, modifier = self._modify_with_rng(question, make_rng(seed, sampler), modifier)
+        MODIFIER_SECONDS.observe(time.perf_counter() - start, modifier or "unchanged")
+        modified["seed"] = seed
+        modified["modifier"] = modifier
+        modified["sampler"] = sampler
+        return modified
+    
+    def select_handler(self, question, modifier=None):
+        """Return (name, handler, match) for the modifier that applies to a question
+        
+        The generic modifier is reported with a None handler, and a question no
+        handler of its topic recognises gives (None, None, None).
+        """
+        if modifier in MODIFIERS_BY_NAME:
+            handlers = [MODIFIERS_BY_NAME[modifier]]
+        elif modifier == "modify_generic_question":
+            handlers = []
         else:
+            handlers = self.get_modifiers(question["topic"])
+        
+        if not handlers:
             # For other topics, perform a simpler modification
             # by changing numerical values
-            modified = copy.deepcopy(question)
-            
-            # Extract numbers from the question
-            values = self.extract_numerical_values(question["question_text"])
+            return "modify_generic_question", None, None
             
-            if values:
-                # Create new values (±20% of original)
-                new_values = [round(val * random.uniform(0.8, 1.2), 2) for val in values]
-                
-                # Replace values in the question
-                new_text = question["question_text"]
-                for i, val in enumerate(values):
-                    # Replace exact value matches only
-                    pattern = r'\b' + re.escape(str(val)) + r'\b'
-                    new_text = re.sub(pattern, str(new_values[i]), new_text, count=1)
-                
-                modified["question_text"] = new_text
-                
-                # Note: In a real implementation, you would need to also update the mark scheme
-                # This would require more sophisticated understanding of the mathematical context
-                modified["mark_scheme"] += "\n[Mark scheme would need to be updated with new values]"
+        for pattern, handler in handlers:
+            if pattern is None:
+                return handler.__name__, handler, None
+            match = pattern.search(question["question_text"])
+            if match:
+                return handler.__name__, handler, match
             
-            return modified
+        # The topic has dedicated handlers but none recognise this question
+        return None, None, None
+    
+    def _modify_with_rng(self, question, rng, modifier=None):
+        name, handler, match = self.select_handler(question, modifier)
+        if name == "modify_generic_question":
+            return self.modify_generic_question(question, rng), name
+        if handler is None:
+            return copy_question(question), None
+        return handler(self, question, match, rng), name
+    
+    def resolve_question(self, question):
+        """Return the full question, rendering it first if it is a lazy variant"""
+        if question is not None and question.get("lazy"):
+            return self.render_variant(question)
+        return question
+    
+    def render_variant(self, descriptor):
+        """Rebuild a generated question from its (original_id, seed, modifier) descriptor"""
+        with self.variant_cache_lock:
+            rendered = self.variant_cache.get(descriptor["id"])
+            if rendered is not None:
+                self.variant_cache.move_to_end(descriptor["id"])
+                return rendered
+        
+        original, _ = self.store.get_question_by_id(descriptor["original_id"])
+        original = self.resolve_question(original)
+        if original is None:
+            print(f"Original question {descriptor['original_id']} for {descriptor['id']} not found")
+            return None
+        
+        rendered = self.modify_question(original, descriptor["seed"], descriptor.get("modifier"),
+                                        descriptor.get("sampler", LEGACY_SAMPLER))
+        for key, value in descriptor.items():
+            if key != "lazy":
+                rendered[key] = value
+        
+        with self.variant_cache_lock:
+            self.variant_cache[descriptor["id"]] = rendered
+            if len(self.variant_cache) > self.variant_cache_size:
+                self.variant_cache.popitem(last=False)
+        return rendered
     
     def get_questions_by_topic(self, topic=None):
         """Get questions filtered by topic"""
         if topic:
-            return self.questions_db.get(topic, [])
+            return self.store.get_questions_by_topic(topic)
         else:
             # Return all questions
-            all_questions = []
-            for topic_questions in self.questions_db.values():
-                all_questions.extend(topic_questions)
-            return all_questions
+            return self.store.get_all_questions()
     
     def get_topics(self):
         """Get list of available topics"""
-        return list(self.questions_db.keys())
+        return self.store.get_topics()
     
-    def create_modified_question(self, original_id=None, topic=None):
-        """Create a modified version of a question"""
+    def create_modified_question(self, original_id=None, topic=None, seed=None):
+        """Create a modified version of a question, reproducibly if a seed is given"""
+        if seed is None:
+            seed = new_seed()
+        
         if original_id:
             # Find question by ID
-            for topic_questions in self.questions_db.values():
-                for question in topic_questions:
-                    if question["id"] == original_id:
-                        return self.modify_question(question)
+            question, _ = self.store.get_question_by_id(original_id)
+            question = self.resolve_question(question)
+            if question is not None:
+                return self.modify_question(question, seed)
             
             print(f"Question with ID {original_id} not found")
             return None
@@ -255,7 +534,8 @@ class QuestionModifier:
             # Pick a random question from the topic
             questions = self.get_questions_by_topic(topic)
             if questions:
-                return self.modify_question(random.choice(questions))
+                question = self.resolve_question(random.Random(seed).choice(questions))
+                return self.modify_question(question, seed)
             else:
                 print(f"No questions found for topic: {topic}")
                 return None
@@ -264,8 +544,8 @@ class QuestionModifier:
             # Pick a random question from any topic
             all_topics = self.get_topics()
             if all_topics:
-                random_topic = random.choice(all_topics)
-                return self.create_modified_question(topic=random_topic)
+                random_topic = random.Random(seed).choice(all_topics)
+                return self.create_modified_question(topic=random_topic, seed=seed)
             else:
                 print("No questions available in the database")
                 return None
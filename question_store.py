@@ -0,0 +1,133 @@
+import bisect
+import threading
+from id_allocator import ulid_lower_bound, variant_sort_key
+from question import as_question
+
+class QuestionStore:
+    # The in-memory store relies on QuestionDatabase for snapshots and journaling
+    persistent = False
+    
+    def __init__(self, questions_db=None):
+        self.lock = threading.RLock()
+        self.questions_db = {}
+        self.id_index = {}
+        self.variant_index = {}
+        self.generated_keys = []
+        # (topic, "original" | "generated") -> append-only list, for filtered pages
+        self.kind_index = {}
+        if questions_db:
+            self.load(questions_db)
+    
+    def load(self, questions_db):
+        """Replace the store contents and rebuild the indexes, holding each question as a Question"""
+        with self.lock:
+            self.questions_db = {}
+            self.id_index = {}
+            self.variant_index = {}
+            self.generated_keys = []
+            self.kind_index = {}
+            for topic, questions in questions_db.items():
+                self.questions_db[topic] = []
+                for question in questions:
+                    self._index(as_question(question), topic, bulk=True)
+            # One sort instead of an insertion per generated question
+            self.generated_keys.sort()
+    
+    def _index(self, question, topic, bulk=False):
+        self.questions_db[topic].append(question)
+        self.id_index[question.get("id")] = (question, topic)
+        kind = "generated" if question.get("generated") else "original"
+        self.kind_index.setdefault((topic, kind), []).append(question)
+        if question.get("generated") and "seed" in question:
+            self.variant_index[(question.get("original_id"), question["seed"])] = question
+        if question.get("generated"):
+            key = (variant_sort_key(question), question.get("id"))
+            if bulk:
+                # load() sorts the keys once they are all in
+                self.generated_keys.append(key)
+            else:
+                # Sorted by allocation time; new IDs almost always land at the end
+                bisect.insort(self.generated_keys, key)
+    
+    def add_question(self, question):
+        """Insert a question, keeping the id and topic indexes up to date"""
+        question = as_question(question)
+        topic = question["topic"]
+        with self.lock:
+            if topic not in self.questions_db:
+                self.questions_db[topic] = []
+            self._index(question, topic)
+        return question
+    
+    def add_questions(self, questions):
+        """Insert several questions at once"""
+        with self.lock:
+            return [self.add_question(question) for question in questions]
+    
+    def snapshot(self):
+        """Return a shallow per-topic copy that is safe to serialise while inserts continue"""
+        with self.lock:
+            return {topic: list(questions) for topic, questions in self.questions_db.items()}
+    
+    def get_topics(self):
+        """Return a list of all topics in the store"""
+        return list(self.questions_db.keys())
+    
+    def get_questions_by_topic(self, topic):
+        """Return all questions for a specific topic"""
+        return self._topic_list(topic)
+    
+    def _topic_list(self, topic, kind=None):
+        if kind:
+            return self.kind_index.get((topic, kind), [])
+        return self.questions_db.get(topic, [])
+    
+    def page_topic(self, topic, cursor=None, limit=20, kind=None):
+        """Return (questions, next_cursor) for one page of a topic
+        
+        Topic lists are append-only, so a cursor is simply the position after
+        the last question returned and stays valid while new questions arrive.
+        `kind` restricts the page to "original" or "generated" questions.
+        """
+        questions = self._topic_list(topic, kind)
+        start = int(cursor) if cursor else 0
+        page = questions[start:start + limit]
+        end = start + len(page)
+        next_cursor = str(end) if end < len(questions) else None
+        return page, next_cursor
+    
+    def version(self, topic=None):
+        """Counter that grows whenever a question is added to the topic (or anywhere)"""
+        if topic is None:
+            return len(self.id_index)
+        return len(self.questions_db.get(topic, []))
+    
+    def count_topic(self, topic):
+        """Return how many questions a topic holds"""
+        return len(self.questions_db.get(topic, []))
+    
+    def get_all_questions(self):
+        """Return every question across all topics"""
+        all_questions = []
+        for topic_questions in self.questions_db.values():
+            all_questions.extend(topic_questions)
+        return all_questions
+    
+    def get_question_by_id(self, question_id):
+        """Find a question by its ID, returning (question, topic)"""
+        return self.id_index.get(question_id, (None, None))
+    
+    def find_variant(self, original_id, seed):
+        """Return the stored variant generated from original_id with this seed, if any"""
+        return self.variant_index.get((original_id, seed))
+    
+    def get_generated_since(self, since):
+        """Return generated questions allocated at or after `since`, oldest first"""
+        start = bisect.bisect_left(self.generated_keys, (ulid_lower_bound(since), ""))
+        return [self.id_index[question_id][0] for _, question_id in self.generated_keys[start:]]
+    
+    def __contains__(self, question_id):
+        return question_id in self.id_index
+    
+    def __len__(self):
+        return len(self.id_index)
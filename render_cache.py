@@ -0,0 +1,39 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+class RenderCache:
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get_or_render(self, key, version, render):
+        """Return (body, etag) for key at this store version, calling render() on a miss
+        
+        Entries for older versions are never returned again and simply age out
+        of the LRU, so bumping the version is all the invalidation needed.
+        """
+        cache_key = (key, version)
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None:
+                self.entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        
+        body = render()
+        entry = (body, hashlib.sha1(body.encode("utf-8")).hexdigest())
+        with self.lock:
+            self.entries[cache_key] = entry
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return entry
+    
+    def clear(self):
+        """Drop every cached page"""
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,210 @@
+import array
+import bisect
+import math
+import re
+import threading
+from collections import Counter
+
+# Exponentials, function names and symbols are kept as tokens of their own,
+# so "e^", "sinh", "det" and "∫" can be searched for like words
+TOKEN_PATTERN = re.compile(r"e\^|[a-z]+|\d+(?:\.\d+)?|[√∫∑πθ²³]|⁻¹")
+STOPWORDS = frozenset([
+    "the", "of", "and", "to", "in", "is", "for", "that", "by", "with", "an",
+    "be", "on", "at", "as", "this", "it", "are", "from", "or", "its"
+])
+
+# BM25 term-frequency saturation and length normalisation
+K1 = 1.2
+B = 0.75
+# Most vocabulary terms a single prefix query may expand to, most frequent first
+MAX_PREFIX_TERMS = 64
+
+def tokenize(text):
+    """Split text into lower-case words, numbers and maths tokens, dropping stopwords"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def question_text(question):
+    """Text indexed for a question: its wording plus its mark scheme"""
+    return f"{question.get('question_text', '')}\n{question.get('mark_scheme', '')}"
+
+def _numpy():
+    # NumPy only speeds up scoring, so it stays optional and is imported on first search
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Documents are numbered in insertion order; per-document data lives in parallel arrays
+        self.doc_ids = []
+        self.doc_numbers = {}
+        self.doc_topics = array.array("I")
+        self.doc_lengths = array.array("I")
+        self.total_length = 0
+        self.topic_numbers = {}
+        self.topic_names = []
+        # term -> (document numbers, term frequencies), both in document order
+        self.postings = {}
+        # Sorted list of all terms, for prefix queries; new terms (every generated
+        # variant brings new numbers) only mark it stale, and the next prefix query re-sorts it
+        self.vocabulary = []
+        self.vocabulary_stale = False
+    
+    def add(self, question_id, text, topic):
+        """Index one question; adding an ID that is already indexed does nothing"""
+        tokens = tokenize(text)
+        with self.lock:
+            if question_id in self.doc_numbers:
+                return
+            topic_number = self.topic_numbers.get(topic)
+            if topic_number is None:
+                topic_number = self.topic_numbers[topic] = len(self.topic_names)
+                self.topic_names.append(topic)
+            
+            doc = len(self.doc_ids)
+            self.doc_ids.append(question_id)
+            self.doc_numbers[question_id] = doc
+            self.doc_topics.append(topic_number)
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+            for term, count in Counter(tokens).items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = (array.array("I"), array.array("I"))
+                    self.vocabulary_stale = True
+                postings[0].append(doc)
+                postings[1].append(count)
+    
+    def add_question(self, question):
+        """Index a question dict by its ID, topic, text and mark scheme"""
+        self.add(question["id"], question_text(question), question["topic"])
+    
+    def expand(self, term):
+        """Return the indexed terms a query term stands for; "sin*" matches every term starting with sin
+        
+        Called with the lock held, as the vocabulary may be re-sorted.
+        """
+        if not term.endswith("*"):
+            return [term] if term in self.postings else []
+        prefix = term[:-1].lower()
+        if not prefix:
+            return []
+        if self.vocabulary_stale:
+            self.vocabulary = sorted(self.postings)
+            self.vocabulary_stale = False
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + "\uffff")
+        terms = self.vocabulary[start:end]
+        if len(terms) > MAX_PREFIX_TERMS:
+            terms = sorted(terms, key=lambda t: -len(self.postings[t][0]))[:MAX_PREFIX_TERMS]
+        return terms
+    
+    def parse_query(self, query):
+        """Return the distinct indexed terms a query searches for"""
+        terms = []
+        for word in query.split():
+            if word.endswith("*"):
+                # Tokenise the prefix too, so "Sinh*" and "det(*" behave like "sinh*" and "det*"
+                tokens = tokenize(word[:-1])
+                if not tokens:
+                    continue
+                words = [*tokens[:-1], tokens[-1] + "*"]
+            else:
+                words = tokenize(word)
+            for token in words:
+                for term in self.expand(token):
+                    if term not in terms:
+                        terms.append(term)
+        return terms
+    
+    def search(self, query, topic=None, limit=20):
+        """Return up to `limit` (question_id, topic, score) tuples, best BM25 score first
+        
+        Words ending in * are prefix queries, and `topic` restricts the results
+        to one topic. Ties keep insertion order, so originals rank before the
+        variants generated from them.
+        """
+        with self.lock:
+            terms = self.parse_query(query)
+            if not terms or not self.doc_ids or limit < 1:
+                return []
+            topic_number = None
+            if topic is not None:
+                topic_number = self.topic_numbers.get(topic)
+                if topic_number is None:
+                    return []
+            
+            np = _numpy()
+            if np is None:
+                ranked = self._score_python(terms, topic_number, limit)
+            else:
+                ranked = self._score_numpy(np, terms, topic_number, limit)
+            return [(self.doc_ids[doc], self.topic_names[self.doc_topics[doc]], score)
+                    for doc, score in ranked]
+    
+    def _weights(self, terms):
+        documents = len(self.doc_ids)
+        average_length = self.total_length / documents or 1.0
+        for term in terms:
+            docs, counts = self.postings[term]
+            df = len(docs)
+            idf = math.log(1 + (documents - df + 0.5) / (df + 0.5))
+            yield docs, counts, idf, average_length
+    
+    def _score_python(self, terms, topic_number, limit):
+        scores = {}
+        lengths = self.doc_lengths
+        for docs, counts, idf, average_length in self._weights(terms):
+            for doc, tf in zip(docs, counts):
+                if topic_number is not None and self.doc_topics[doc] != topic_number:
+                    continue
+                norm = K1 * (1 - B + B * lengths[doc] / average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+    
+    def _score_numpy(self, np, terms, topic_number, limit):
+        # Runs under the lock and returns plain lists, so no array view of the
+        # index outlives it (a live view would stop add() from growing the arrays)
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        topics = np.frombuffer(self.doc_topics, dtype=np.uint32)
+        doc_parts = []
+        score_parts = []
+        for docs, counts, idf, average_length in self._weights(terms):
+            docs = np.frombuffer(docs, dtype=np.uint32)
+            tf = np.frombuffer(counts, dtype=np.uint32).astype(np.float64)
+            if topic_number is not None:
+                keep = topics[docs] == topic_number
+                docs, tf = docs[keep], tf[keep]
+            norm = K1 * (1 - B + B * lengths[docs] / average_length)
+            doc_parts.append(docs)
+            score_parts.append(idf * tf * (K1 + 1) / (tf + norm))
+        
+        docs = np.concatenate(doc_parts)
+        scores = np.concatenate(score_parts)
+        if len(doc_parts) > 1:
+            # Sum the contributions of each term per document; every contribution
+            # is positive, so the non-zero totals are exactly the matching documents
+            totals = np.bincount(docs, weights=scores, minlength=len(self.doc_ids))
+            docs = np.flatnonzero(totals)
+            scores = totals[docs]
+        if not len(docs):
+            return []
+        
+        if len(docs) > limit:
+            # Variants of one question often tie, so take everything above the
+            # limit-th best score and fill up with the earliest documents on it;
+            # docs is sorted, so the earliest come first
+            threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            above = np.flatnonzero(scores > threshold)
+            tied = np.flatnonzero(scores == threshold)[:limit - len(above)]
+            keep = np.concatenate([above, tied])
+            docs, scores = docs[keep], scores[keep]
+        order = np.lexsort((docs, -scores))
+        return list(zip(docs[order].tolist(), scores[order].tolist()))
+    
+    def __len__(self):
+        return len(self.doc_ids)
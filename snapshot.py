@@ -0,0 +1,468 @@
+import bisect
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from question import question_hook, json_default
+from question_store import QuestionStore
+from id_allocator import variant_sort_key, ulid_lower_bound, decode_base32, TIMESTAMP_LENGTH
+from dedup import exact_key
+
+SNAPSHOT_EXTENSIONS = (".qsnap",)
+
+# File layout: header | question bodies (compact JSON) | fixed-width tables | JSON manifest.
+# The header points at the manifest, which names each table's offset, length and type;
+# tables are written in native byte order and 8-byte aligned so they map straight
+# onto memoryviews without being parsed.
+MAGIC = b"QSNAP\x00\r\n"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")  # magic, version, reserved, manifest offset, manifest length
+
+def stable_hash(*parts):
+    """64-bit hash of strings or bytes that, unlike hash(), is the same in every process"""
+    digest = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return int.from_bytes(digest.digest(), "little")
+
+def text_hash(text, topic):
+    """Hash matching DedupIndex's exact level: the topic plus the whitespace-normalised text"""
+    return stable_hash(topic, exact_key(text))
+
+def _sorted_table(pairs):
+    """Split (hash, position) pairs into parallel arrays sorted by hash"""
+    pairs.sort()
+    return array("Q", [h for h, _ in pairs]), array("I", [position for _, position in pairs])
+
+def write_snapshot(f, questions_db):
+    """Write a {topic: [questions]} bank to the binary file object f in snapshot format"""
+    f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, 0))
+    offsets = array("Q")
+    lengths = array("I")
+    kinds = array("I")
+    id_pairs = []
+    variant_pairs = []
+    text_pairs = []
+    generated = []
+    topics = []
+    
+    position = 0
+    offset = HEADER.size
+    for topic, questions in questions_db.items():
+        originals = []
+        variants = []
+        start = position
+        for question in questions:
+            body = json.dumps(question, separators=(",", ":"), ensure_ascii=False,
+                              default=json_default).encode("utf-8")
+            f.write(body)
+            offsets.append(offset)
+            lengths.append(len(body))
+            offset += len(body)
+            
+            id_pairs.append((stable_hash(question.get("id")), position))
+            if question.get("generated"):
+                variants.append(position)
+                sort_key = variant_sort_key(question)
+                generated.append((decode_base32(sort_key[:TIMESTAMP_LENGTH]), sort_key,
+                                  question.get("id"), position))
+                if "seed" in question:
+                    variant_pairs.append((stable_hash(question.get("original_id"), question["seed"]), position))
+            else:
+                originals.append(position)
+            if question.get("question_text"):
+                text_pairs.append((text_hash(question["question_text"], topic), position))
+            position += 1
+        
+        topics.append({
+            "name": topic,
+            "start": start,
+            "count": position - start,
+            "original": [len(kinds), len(originals)],
+            "generated": [len(kinds) + len(originals), len(variants)]
+        })
+        kinds.extend(originals)
+        kinds.extend(variants)
+    
+    generated.sort()
+    id_hashes, id_positions = _sorted_table(id_pairs)
+    variant_hashes, variant_positions = _sorted_table(variant_pairs)
+    text_hashes, text_positions = _sorted_table(text_pairs)
+    tables = {
+        "offsets": offsets,
+        "lengths": lengths,
+        "kinds": kinds,
+        "id_hashes": id_hashes,
+        "id_positions": id_positions,
+        "variant_hashes": variant_hashes,
+        "variant_positions": variant_positions,
+        "text_hashes": text_hashes,
+        "text_positions": text_positions,
+        "generated_millis": array("Q", [millis for millis, _, _, _ in generated]),
+        "generated_positions": array("I", [position for _, _, _, position in generated])
+    }
+    
+    layout = {}
+    for name, table in tables.items():
+        padding = -offset % 8
+        f.write(b"\x00" * padding)
+        offset += padding
+        data = table.tobytes()
+        f.write(data)
+        layout[name] = [offset, len(table), table.typecode]
+        offset += len(data)
+    
+    manifest = json.dumps({
+        "count": position,
+        "byteorder": sys.byteorder,
+        "topics": topics,
+        "tables": layout
+    }).encode("utf-8")
+    f.write(manifest)
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, offset, len(manifest)))
+    f.seek(0, os.SEEK_END)
+    return position
+
+class Snapshot:
+    def __init__(self, path=None, cache_size=4096):
+        self.path = path
+        # Decoded questions, most recently used last; bodies are only parsed when asked for
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_lock = threading.Lock()
+        self.map = None
+        self.count = 0
+        self.topics = []
+        self.tables = {}
+        # (device, inode) of the mapped file; a replaced snapshot has a new one
+        self.identity = None
+        
+        if path is not None:
+            with open(path, "rb") as f:
+                # Read-only and shared: every worker mapping the file uses the same page cache
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                stat = os.fstat(f.fileno())
+                self.identity = (stat.st_dev, stat.st_ino)
+            magic, version, _, manifest_offset, manifest_length = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {FORMAT_VERSION} question snapshot")
+            manifest = json.loads(self.map[manifest_offset:manifest_offset + manifest_length])
+            if manifest["byteorder"] != sys.byteorder:
+                raise ValueError(f"{path} was written on a {manifest['byteorder']}-endian machine; "
+                                 "convert it through JSON")
+            self.count = manifest["count"]
+            self.topics = manifest["topics"]
+            view = memoryview(self.map)
+            for name, (offset, length, typecode) in manifest["tables"].items():
+                size = array(typecode).itemsize
+                self.tables[name] = view[offset:offset + length * size].cast(typecode)
+        
+        self.topic_index = {topic["name"]: topic for topic in self.topics}
+        self.topic_starts = [topic["start"] for topic in self.topics]
+        self.offsets = self.tables.get("offsets", ())
+        self.lengths = self.tables.get("lengths", ())
+    
+    def body(self, position):
+        """Return the encoded body of the question at a position"""
+        offset = self.offsets[position]
+        return self.map[offset:offset + self.lengths[position]]
+    
+    def decode(self, position):
+        """Decode the question at a position without going through the cache"""
+        return json.loads(self.body(position), object_hook=question_hook)
+    
+    def question(self, position):
+        """Return the question at a position, decoding it on first access"""
+        with self.cache_lock:
+            question = self.cache.get(position)
+            if question is not None:
+                self.cache.move_to_end(position)
+                return question
+        
+        question = self.decode(position)
+        with self.cache_lock:
+            self.cache[position] = question
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return question
+    
+    def topic_of(self, position):
+        """Return the topic a position belongs to"""
+        return self.topics[bisect.bisect_right(self.topic_starts, position) - 1]["name"]
+    
+    def questions(self, topic=None, kind=None):
+        """Return a lazy sequence of one topic's questions (of one kind), or of every question"""
+        if topic is None:
+            return SnapshotView(self, range(self.count))
+        entry = self.topic_index.get(topic)
+        if entry is None:
+            return SnapshotView(self, range(0))
+        if kind:
+            start, count = entry[kind]
+            return SnapshotView(self, self.tables["kinds"][start:start + count])
+        return SnapshotView(self, range(entry["start"], entry["start"] + entry["count"]))
+    
+    def count_topic(self, topic):
+        """Return how many questions a topic holds in the snapshot"""
+        entry = self.topic_index.get(topic)
+        return entry["count"] if entry else 0
+    
+    def _lookup(self, table, key):
+        """Yield the positions stored under a hash in one of the sorted hash tables"""
+        hashes = self.tables.get(table + "_hashes")
+        if not hashes:
+            return
+        positions = self.tables[table + "_positions"]
+        i = bisect.bisect_left(hashes, key)
+        while i < len(hashes) and hashes[i] == key:
+            yield positions[i]
+            i += 1
+    
+    def find_id(self, question_id):
+        """Return the position of a question ID, or None"""
+        for position in self._lookup("id", stable_hash(question_id)):
+            if self.question(position).get("id") == question_id:
+                return position
+        return None
+    
+    def find_variant(self, original_id, seed):
+        """Return the position of the variant of original_id generated with seed, or None"""
+        for position in self._lookup("variant", stable_hash(original_id, seed)):
+            question = self.question(position)
+            if question.get("original_id") == original_id and question.get("seed") == seed:
+                return position
+        return None
+    
+    def find_text(self, text, topic):
+        """Return the ID of a question in the topic with the same normalised text, or None"""
+        key = exact_key(text)
+        for position in self._lookup("text", text_hash(text, topic)):
+            question = self.question(position)
+            if question.get("topic") == topic and exact_key(question.get("question_text")) == key:
+                return question["id"]
+        return None
+    
+    def generated_since(self, since):
+        """Return generated questions allocated at or after `since`, oldest first"""
+        millis = self.tables.get("generated_millis")
+        if not millis:
+            return []
+        start = bisect.bisect_left(millis, decode_base32(ulid_lower_bound(since)[:TIMESTAMP_LENGTH]))
+        return SnapshotView(self, self.tables["generated_positions"][start:])
+    
+    def __len__(self):
+        return self.count
+
+class SnapshotView(Sequence):
+    def __init__(self, snapshot, positions):
+        self.snapshot = snapshot
+        self.positions = positions
+    
+    def __len__(self):
+        return len(self.positions)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.snapshot.question(position) for position in self.positions[index]]
+        return self.snapshot.question(self.positions[index])
+    
+    def __iter__(self):
+        # Bulk reads (compaction, index builds) bypass the cache so hot questions stay in it
+        for position in self.positions:
+            yield self.snapshot.decode(position)
+
+class ChainedView(Sequence):
+    def __init__(self, parts):
+        self.parts = [part for part in parts if len(part)]
+        self.ends = []
+        total = 0
+        for part in self.parts:
+            total += len(part)
+            self.ends.append(total)
+    
+    def __len__(self):
+        return self.ends[-1] if self.ends else 0
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("question index out of range")
+        part = bisect.bisect_right(self.ends, index)
+        return self.parts[part][index - (self.ends[part - 1] if part else 0)]
+    
+    def __iter__(self):
+        for part in self.parts:
+            yield from part
+
+class SnapshotQuestionStore(QuestionStore):
+    # The mapped snapshot is read-only; questions added after opening it (journal
+    # replay, new variants) are held by the in-memory store this class extends,
+    # and load() replaces only those. When another process replaces the file,
+    # reopen() maps the new one
+    
+    def __init__(self, snapshot_path, questions_db=None, cache_size=4096):
+        self.snapshot_path = snapshot_path
+        try:
+            self.base = Snapshot(snapshot_path, cache_size)
+        except FileNotFoundError:
+            print(f"Warning: Snapshot file not found at {snapshot_path}")
+            self.base = Snapshot(None, cache_size)
+        super().__init__(questions_db)
+    
+    def reopen(self):
+        """Map the snapshot file again if it has been replaced, returning whether it had
+        
+        Added questions that the new snapshot already holds are dropped from the overlay.
+        """
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return False
+        if (stat.st_dev, stat.st_ino) == self.base.identity:
+            return False
+        
+        base = Snapshot(self.snapshot_path, self.base.cache_size)
+        with self.lock:
+            added = {}
+            for question in self.get_added_questions():
+                if base.find_id(question.get("id")) is None:
+                    added.setdefault(question["topic"], []).append(question)
+            self.base = base
+            self.load(added)
+        return True
+    
+    def _topic_list(self, topic, kind=None):
+        return ChainedView([self.base.questions(topic, kind), super()._topic_list(topic, kind)])
+    
+    def snapshot(self):
+        """Return a per-topic view that is safe to serialise while inserts continue"""
+        with self.lock:
+            return {topic: ChainedView([self.base.questions(topic), list(self.questions_db.get(topic, []))])
+                    for topic in self.get_topics()}
+    
+    def get_topics(self):
+        """Return the snapshot's topics followed by any topics only added since"""
+        topics = [topic["name"] for topic in self.base.topics]
+        return topics + [topic for topic in self.questions_db if topic not in self.base.topic_index]
+    
+    def version(self, topic=None):
+        """Counter that grows whenever a question is added to the topic (or anywhere)"""
+        if topic is None:
+            return len(self)
+        return self.base.count_topic(topic) + len(self.questions_db.get(topic, []))
+    
+    def count_topic(self, topic):
+        """Return how many questions a topic holds"""
+        return self.base.count_topic(topic) + len(self.questions_db.get(topic, []))
+    
+    def get_all_questions(self):
+        """Return a lazy sequence of every question, topic by topic"""
+        return ChainedView([self._topic_list(topic) for topic in self.get_topics()])
+    
+    def get_added_questions(self):
+        """Return the questions added since the snapshot was opened"""
+        return super().get_all_questions()
+    
+    def get_question_by_id(self, question_id):
+        """Find a question by its ID, returning (question, topic)"""
+        found = self.id_index.get(question_id)
+        if found is not None:
+            return found
+        position = self.base.find_id(question_id)
+        if position is None:
+            return None, None
+        return self.base.question(position), self.base.topic_of(position)
+    
+    def find_variant(self, original_id, seed):
+        """Return the stored variant generated from original_id with this seed, if any"""
+        variant = self.variant_index.get((original_id, seed))
+        if variant is not None:
+            return variant
+        position = self.base.find_variant(original_id, seed)
+        return None if position is None else self.base.question(position)
+    
+    def find_text(self, text, topic):
+        """Return the ID of a snapshot question in the topic with the same normalised text"""
+        return self.base.find_text(text, topic)
+    
+    def get_generated_since(self, since):
+        """Return generated questions allocated at or after `since`, oldest first"""
+        return list(heapq.merge(self.base.generated_since(since), super().get_generated_since(since),
+                                key=lambda question: (variant_sort_key(question), question.get("id"))))
+    
+    def __contains__(self, question_id):
+        return question_id in self.id_index or self.base.find_id(question_id) is not None
+    
+    def __len__(self):
+        return len(self.base) + len(self.id_index)
+
+def merged_snapshot(snapshot_path, questions):
+    """Return {topic: questions} for a snapshot file followed by questions whose IDs it lacks"""
+    try:
+        base = Snapshot(snapshot_path)
+    except FileNotFoundError:
+        base = Snapshot(None)
+    added = {}
+    seen = set()
+    for question in questions:
+        question_id = question.get("id")
+        if question_id in seen or base.find_id(question_id) is not None:
+            continue
+        seen.add(question_id)
+        added.setdefault(question["topic"], []).append(question)
+    
+    topics = [topic["name"] for topic in base.topics]
+    topics += [topic for topic in added if topic not in base.topic_index]
+    return {topic: ChainedView([base.questions(topic), added.get(topic, [])]) for topic in topics}
+
+def json_to_snapshot(json_path, snapshot_path):
+    """Convert a question_database.json file into a snapshot file"""
+    with open(json_path, "r") as f:
+        questions_db = json.load(f)
+    
+    tmp_path = snapshot_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        count = write_snapshot(f, questions_db)
+    os.replace(tmp_path, snapshot_path)
+    print(f"Wrote {count} questions from {json_path} to {snapshot_path}")
+    return count
+
+def snapshot_to_json(snapshot_path, json_path):
+    """Convert a snapshot file back into the question_database.json layout"""
+    snapshot = Snapshot(snapshot_path)
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        # Bodies are already JSON, so they are copied across without being decoded
+        f.write("{")
+        for i, topic in enumerate(snapshot.topics):
+            bodies = (snapshot.body(position).decode("utf-8")
+                      for position in range(topic["start"], topic["start"] + topic["count"]))
+            f.write(f'{", " if i else ""}{json.dumps(topic["name"])}: [')
+            f.write(", ".join(bodies))
+            f.write("]")
+        f.write("}\n")
+    os.replace(tmp_path, json_path)
+    print(f"Wrote {snapshot.count} questions from {snapshot_path} to {json_path}")
+    return snapshot.count
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python snapshot.py <question_database.json> <question_database.qsnap>")
+        print("       python snapshot.py <question_database.qsnap> <question_database.json>")
+        sys.exit(1)
+    if sys.argv[1].endswith(SNAPSHOT_EXTENSIONS):
+        snapshot_to_json(sys.argv[1], sys.argv[2])
+    else:
+        json_to_snapshot(sys.argv[1], sys.argv[2])
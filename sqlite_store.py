@@ -0,0 +1,222 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import datetime
+from question import json_default
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    generated INTEGER NOT NULL DEFAULT 0,
+    original_id TEXT,
+    generated_on TEXT,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_id ON questions (id);
+CREATE INDEX IF NOT EXISTS idx_questions_topic ON questions (topic, seq);
+CREATE INDEX IF NOT EXISTS idx_questions_topic_generated ON questions (topic, generated, seq);
+CREATE INDEX IF NOT EXISTS idx_questions_original_id ON questions (original_id);
+CREATE INDEX IF NOT EXISTS idx_questions_generated_on ON questions (generated_on);
+"""
+
+class SQLiteQuestionStore:
+    # Every read goes to the database file, so workers never see a stale copy
+    persistent = True
+    
+    def __init__(self, database_path="scraped_data/question_database.db", timeout=30):
+        self.database_path = database_path
+        self.timeout = timeout
+        self.lock = threading.RLock()
+        self._local = threading.local()
+        
+        directory = os.path.dirname(database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+    
+    def connection(self):
+        """Return this thread's connection, opening it in WAL mode on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.database_path, timeout=self.timeout)
+            # WAL lets readers in other processes proceed while one writer commits
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def _row_values(self, question):
+        return (
+            question["id"],
+            question["topic"],
+            1 if question.get("generated") else 0,
+            question.get("original_id"),
+            question.get("generated_on"),
+            json.dumps(question, default=json_default),
+        )
+    
+    def load(self, questions_db):
+        """Insert every question from a topic -> questions mapping, skipping known IDs"""
+        rows = [self._row_values(q) for questions in questions_db.values() for q in questions]
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO questions (id, topic, generated, original_id, generated_on, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+    
+    def add_question(self, question):
+        """Insert a single question row"""
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT INTO questions (id, topic, generated, original_id, generated_on, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                self._row_values(question)
+            )
+        return question
+    
+    def add_questions(self, questions):
+        """Insert several questions in one transaction"""
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT INTO questions (id, topic, generated, original_id, generated_on, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [self._row_values(q) for q in questions]
+            )
+        return questions
+    
+    @property
+    def questions_db(self):
+        return self.snapshot()
+    
+    def snapshot(self):
+        """Return the whole bank in the JSON topic -> questions layout"""
+        questions_db = {}
+        for topic, data in self.connection().execute("SELECT topic, data FROM questions ORDER BY seq"):
+            questions_db.setdefault(topic, []).append(json.loads(data))
+        return questions_db
+    
+    def get_topics(self):
+        """Return a list of all topics in the store, in insertion order"""
+        rows = self.connection().execute(
+            "SELECT topic FROM questions GROUP BY topic ORDER BY MIN(seq)"
+        )
+        return [topic for (topic,) in rows]
+    
+    def get_questions_by_topic(self, topic):
+        """Return all questions for a specific topic"""
+        rows = self.connection().execute(
+            "SELECT data FROM questions WHERE topic = ? ORDER BY seq", (topic,)
+        )
+        return [json.loads(data) for (data,) in rows]
+    
+    def page_topic(self, topic, cursor=None, limit=20, kind=None):
+        """Return (questions, next_cursor) for one page of a topic
+        
+        The cursor is the seq of the last row returned, so pages stay stable
+        while other workers insert and each page is one index range scan.
+        """
+        query = "SELECT seq, data FROM questions WHERE topic = ? AND seq > ?"
+        params = [topic, int(cursor) if cursor else 0]
+        if kind:
+            query += " AND generated = ?"
+            params.append(1 if kind == "generated" else 0)
+        query += " ORDER BY seq LIMIT ?"
+        params.append(limit + 1)
+        
+        rows = self.connection().execute(query, params).fetchall()
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        return [json.loads(data) for _, data in rows[:limit]], next_cursor
+    
+    def version(self, topic=None):
+        """Counter that grows whenever a question is added to the topic (or anywhere)
+        
+        This is the newest row's seq, one index seek rather than a count of the
+        topic's rows, as it is read on every page request.
+        """
+        if topic is None:
+            row = self.connection().execute("SELECT MAX(seq) FROM questions").fetchone()
+        else:
+            row = self.connection().execute(
+                "SELECT MAX(seq) FROM questions WHERE topic = ?", (topic,)
+            ).fetchone()
+        return row[0] or 0
+    
+    def count_topic(self, topic):
+        """Return how many questions a topic holds"""
+        return self.connection().execute(
+            "SELECT COUNT(*) FROM questions WHERE topic = ?", (topic,)
+        ).fetchone()[0]
+    
+    def get_all_questions(self):
+        """Return every question across all topics"""
+        return [json.loads(data) for (data,) in self.connection().execute("SELECT data FROM questions ORDER BY seq")]
+    
+    def get_question_by_id(self, question_id):
+        """Find a question by its ID, returning (question, topic)"""
+        row = self.connection().execute(
+            "SELECT data, topic FROM questions WHERE id = ?", (question_id,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+    
+    def get_variants(self, original_id):
+        """Return all questions generated from a given original"""
+        rows = self.connection().execute(
+            "SELECT data FROM questions WHERE original_id = ? ORDER BY seq", (original_id,)
+        )
+        return [json.loads(data) for (data,) in rows]
+    
+    def find_variant(self, original_id, seed):
+        """Return the stored variant generated from original_id with this seed, if any"""
+        row = self.connection().execute(
+            "SELECT data FROM questions WHERE original_id = ? AND json_extract(data, '$.seed') = ?",
+            (original_id, seed)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def get_generated_since(self, since):
+        """Return generated questions created at or after `since`, oldest first"""
+        if isinstance(since, datetime.datetime):
+            since = since.strftime("%Y%m%d%H%M%S")
+        rows = self.connection().execute(
+            "SELECT data FROM questions WHERE generated = 1 AND generated_on >= ? ORDER BY generated_on, id",
+            (since,)
+        )
+        return [json.loads(data) for (data,) in rows]
+    
+    def __contains__(self, question_id):
+        row = self.connection().execute(
+            "SELECT 1 FROM questions WHERE id = ?", (question_id,)
+        ).fetchone()
+        return row is not None
+    
+    def __len__(self):
+        return self.connection().execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+def import_json(json_path, database_path):
+    """One-shot import of an existing question_database.json into SQLite"""
+    with open(json_path, "r") as f:
+        questions_db = json.load(f)
+    
+    store = SQLiteQuestionStore(database_path)
+    before = len(store)
+    store.load(questions_db)
+    imported = len(store) - before
+    print(f"Imported {imported} questions from {json_path} into {database_path}")
+    return imported
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python sqlite_store.py <question_database.json> <question_database.db>")
+        sys.exit(1)
+    import_json(sys.argv[1], sys.argv[2])
@@ -0,0 +1,164 @@
+import functools
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from metrics import histogram, counter, gauge
+
+SOLVE_SECONDS = histogram("symbolic_solve_seconds", "Time taken by each SymPy solve, including ones that timed out",
+                          ["kind"])
+
+def load_sympy():
+    """Import SymPy on first use
+    
+    SymPy takes longer to import than the rest of the app together, so it is
+    never imported at module level; solvers call this when they first run.
+    """
+    import sympy
+    return sympy
+
+def to_text(expr):
+    """Render a SymPy expression in the notation the mark schemes use, e.g. 5e^(6) - 8"""
+    sp = load_sympy()
+    text = sp.sstr(expr, order="rev-lex")
+    text = text.replace("exp(", "e^(").replace("**", "^").replace("*", "")
+    return re.sub(r"(?<![A-Za-z])E(?![A-Za-z])", "e", text)
+
+# kind -> function(*params) returning plain Python values; all of them use SymPy
+SOLVERS = {}
+
+def solver(kind):
+    """Register a symbolic solver for the given kind of problem"""
+    def decorator(func):
+        SOLVERS[kind] = func
+        return func
+    return decorator
+
+@functools.lru_cache(maxsize=None)
+def _linear_de_constant():
+    """Solve dy/dx + ky = re^(-kx), y(x0) = y0 once with symbolic parameters
+    
+    dsolve takes a fraction of a second, so it runs once per process and each
+    parameter set only substitutes into the result. Returns (symbols, C).
+    """
+    sp = load_sympy()
+    x, x0, y0 = sp.symbols("x x0 y0")
+    k, r = sp.symbols("k r", positive=True)
+    y = sp.Function("y")
+    solution = sp.dsolve(sp.Eq(y(x).diff(x) + k * y(x), r * sp.exp(-k * x)), y(x), ics={y(x0): y0}).rhs
+    # Multiplying through by the integrating factor leaves e^(kx)y = rx + C
+    return (k, r, x0, y0), sp.simplify(solution * sp.exp(k * x) - r * x)
+
+@solver("linear_de")
+def solve_linear_de(k, r, x0, y0):
+    """Constant C in the solution e^(kx)y = rx + C of dy/dx + ky = re^(-kx), y(x0) = y0"""
+    sp = load_sympy()
+    symbols, C = _linear_de_constant()
+    C = sp.expand(C.subs(dict(zip(symbols, (k, r, x0, y0)))))
+    return {"C": to_text(C), "C_is_integer": bool(C.is_Integer)}
+
+@solver("det")
+def solve_det(a, b, c, d):
+    """Determinant of [[a, b], [c, d]]"""
+    sp = load_sympy()
+    return {"det": int(sp.Matrix([[a, b], [c, d]]).det())}
+
+@solver("inverse")
+def solve_inverse(a, b, c, d):
+    """Determinant and exact inverse of the non-singular matrix [[a, b], [c, d]]"""
+    sp = load_sympy()
+    matrix = sp.Matrix([[a, b], [c, d]])
+    inverse = matrix.inv()
+    return {"det": int(matrix.det()), "inverse": [[str(inverse[i, j]) for j in range(2)] for i in range(2)]}
+
+def root_text(re_part, im_part):
+    """Render a root to 4 d.p. as the mark schemes list it, e.g. 0.5771 - 1.9998i"""
+    if abs(im_part) < 1e-12:
+        return f"{re_part:.4f}"
+    return f"{re_part:.4f} {'+' if im_part > 0 else '-'} {abs(im_part):.4f}i"
+
+@solver("roots")
+def solve_roots(*coefficients):
+    """Roots of the polynomial with these coefficients (highest power first), to 4 d.p."""
+    sp = load_sympy()
+    z = sp.Symbol("z")
+    return {"roots": [root_text(*(float(part) for part in root.as_real_imag()))
+                      for root in sp.Poly(list(coefficients), z).nroots(n=15)]}
+
+class SymbolicSolver:
+    def __init__(self, maxsize=4096, timeout=2.0, max_workers=2):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        # (kind, params) -> result, least recently used first
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+    
+    def solve(self, kind, *params):
+        """Return the memoised solution for (kind, params), or None if it is not ready in time
+        
+        A solve that outlives the timeout keeps running and is cached when it
+        finishes, so a later request with the same parameters gets it for free.
+        Concurrent requests for the same parameters share one solve.
+        """
+        key = (kind, params)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+            future = self.in_flight.get(key)
+            if future is None:
+                future = self.executor.submit(self._run, kind, params)
+                self.in_flight[key] = future
+                future.add_done_callback(lambda done: self._store(key, done))
+        
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self.lock:
+                self.timeouts += 1
+            print(f"Warning: Symbolic {kind} solve for {params} timed out")
+        except Exception as e:
+            print(f"Warning: Symbolic {kind} solve for {params} failed: {e}")
+        return None
+    
+    def _run(self, kind, params):
+        start = time.perf_counter()
+        try:
+            return SOLVERS[kind](*params)
+        finally:
+            SOLVE_SECONDS.observe(time.perf_counter() - start, kind)
+    
+    def _store(self, key, future):
+        with self.lock:
+            self.in_flight.pop(key, None)
+            if future.exception() is not None:
+                return
+            self.cache[key] = future.result()
+            if len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+    
+    def stats(self):
+        """Return cache size and hit/miss/timeout counters"""
+        with self.lock:
+            return {"cached": len(self.cache), "hits": self.hits, "misses": self.misses,
+                    "timeouts": self.timeouts}
+
+default_solver = SymbolicSolver()
+
+# Read from the solver's counters when /metrics is scraped
+counter("symbolic_cache_hits_total", "Symbolic solves answered from the cache",
+        function=lambda: default_solver.stats()["hits"])
+counter("symbolic_cache_misses_total", "Symbolic solves not in the cache",
+        function=lambda: default_solver.stats()["misses"])
+counter("symbolic_timeouts_total", "Symbolic solves that exceeded the timeout",
+        function=lambda: default_solver.stats()["timeouts"])
+gauge("symbolic_cache_entries", "Solutions held in the symbolic solver cache",
+      function=lambda: default_solver.stats()["cached"])
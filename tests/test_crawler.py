@@ -0,0 +1,125 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from crawler import Crawler
+from http_cache import ResponseCache
+from web_scraper import MathQuestionScraper
+
+ROBOTS_TXT = "User-agent: *\nDisallow: /private/\n"
+PAGES = {
+    "/topics.htm": "<html><body><a href='/fm/complex.htm'>FM Complex Numbers</a></body></html>",
+    "/fm/complex.htm": "<html><body><p>Find the modulus of z = 3 + 4i.</p></body></html>",
+    "/private/answers.htm": "<html><body>Answers</body></html>"
+}
+ETAG = '"v1"'
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers), time.monotonic()))
+        if self.path == "/robots.txt":
+            return self._send(200, ROBOTS_TXT)
+        if self.path == "/flaky.htm" and self.server.failures > 0:
+            self.server.failures -= 1
+            return self._send(503, "busy")
+        if self.path == "/flaky.htm":
+            return self._send(200, "recovered")
+        if self.path not in PAGES:
+            return self._send(404, "not found")
+        if self.headers.get("If-None-Match") == ETAG:
+            return self._send(304, None)
+        return self._send(200, PAGES[self.path], {"ETag": ETAG})
+    
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        data = body.encode("utf-8") if body is not None else b""
+        if status != 304:
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    httpd.requests = []
+    httpd.failures = 0
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    httpd.base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def paths(server, path):
+    return [entry for entry in server.requests if entry[0] == path]
+
+def test_robots_txt_is_fetched_once_and_obeyed(server):
+    crawler = Crawler(rate=100, burst=10)
+    try:
+        assert "modulus" in crawler.fetch(server.base_url + "/fm/complex.htm")
+        assert crawler.fetch(server.base_url + "/private/answers.htm") is None
+        assert crawler.fetch(server.base_url + "/topics.htm") is not None
+    finally:
+        crawler.close()
+    
+    assert len(paths(server, "/robots.txt")) == 1
+    assert paths(server, "/private/answers.htm") == []
+
+def test_robots_txt_can_be_ignored(server):
+    crawler = Crawler(rate=100, burst=10, respect_robots=False)
+    try:
+        assert crawler.fetch(server.base_url + "/private/answers.htm") is not None
+    finally:
+        crawler.close()
+    assert paths(server, "/robots.txt") == []
+
+def test_token_bucket_spaces_requests_to_one_host(server):
+    rate = 20
+    crawler = Crawler(rate=rate, burst=1, per_host_limit=4, respect_robots=False)
+    try:
+        items = [(i, server.base_url + "/fm/complex.htm") for i in range(6)]
+        results = list(crawler.fetch_all(items))
+    finally:
+        crawler.close()
+    
+    assert all(text for _, _, text in results)
+    times = sorted(t for _, _, t in paths(server, "/fm/complex.htm"))
+    # After the first token, each request waits for the bucket to refill
+    assert times[-1] - times[0] >= (len(times) - 1) / rate * 0.9
+
+def test_retries_a_busy_server(server):
+    server.failures = 2
+    crawler = Crawler(rate=100, burst=10, backoff_base=0.01, respect_robots=False)
+    try:
+        assert crawler.fetch(server.base_url + "/flaky.htm") == "recovered"
+    finally:
+        crawler.close()
+    assert len(paths(server, "/flaky.htm")) == 3
+
+def test_cached_page_is_revalidated_with_etag(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    crawler = Crawler(rate=100, burst=10)
+    scraper = MathQuestionScraper(crawler=crawler, cache=ResponseCache(str(tmp_path / "http_cache")))
+    url = server.base_url + "/fm/complex.htm"
+    try:
+        first = scraper.get_page(url)
+        second = scraper.get_page(url)
+    finally:
+        crawler.close()
+    
+    assert first == second == PAGES["/fm/complex.htm"]
+    page_requests = paths(server, "/fm/complex.htm")
+    assert len(page_requests) == 2
+    assert "If-None-Match" not in page_requests[0][1]
+    assert page_requests[1][1]["If-None-Match"] == ETAG
+    
+    # Offline mode replays the revalidated copy without any request
+    offline = MathQuestionScraper(offline=True, cache=ResponseCache(str(tmp_path / "http_cache")))
+    assert offline.get_page(url) == first
+    assert len(server.requests) == 3
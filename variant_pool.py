@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+class VariantPool:
+    def __init__(self, generator, pool_size=5, refill_rate=50.0, max_originals=1000):
+        self.generator = generator
+        self.pool_size = pool_size
+        self.refill_rate = refill_rate
+        self.max_originals = max_originals
+        # original_id -> ready-made, not yet stored variants; least recently used first
+        self.pools = OrderedDict()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.refilled = 0
+        self._worker = None
+        self._worker_pid = None
+        self._stopped = False
+    
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._worker_pid != os.getpid() or not self._worker.is_alive():
+            self._worker_pid = os.getpid()
+            self._worker = threading.Thread(target=self._refill_loop, daemon=True)
+            self._worker.start()
+    
+    def pop(self, original_id):
+        """Take a ready variant of original_id, or None if the pool for it is empty"""
+        with self.lock:
+            if self.pool_size <= 0:
+                return None
+            self._ensure_worker()
+            
+            pool = self.pools.get(original_id)
+            if pool is None:
+                # First request for this original: start keeping a pool for it
+                pool = self.pools[original_id] = deque()
+                if len(self.pools) > self.max_originals:
+                    self.pools.popitem(last=False)
+            self.pools.move_to_end(original_id)
+            
+            variant = pool.popleft() if pool else None
+            if variant is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        self.wakeup.set()
+        return variant
+    
+    def _next_to_refill(self):
+        with self.lock:
+            # Most recently requested originals are topped up first
+            for original_id in reversed(self.pools):
+                if len(self.pools[original_id]) < self.pool_size:
+                    return original_id, self.pool_size - len(self.pools[original_id])
+        return None, 0
+    
+    def _refill_loop(self):
+        while not self._stopped:
+            original_id, missing = self._next_to_refill()
+            if original_id is None:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            
+            # Top the pool up in one vectorised pass
+            variants = self.generator.generate_variants(original_id, count=missing)
+            with self.lock:
+                if variants is None:
+                    # Unknown or deleted original; stop trying to fill it
+                    self.pools.pop(original_id, None)
+                elif original_id in self.pools:
+                    self.pools[original_id].extend(variants)
+                    self.refilled += len(variants)
+            
+            # Pace generation so refills never starve request threads of CPU
+            if self.refill_rate > 0:
+                time.sleep(missing / self.refill_rate)
+    
+    def stats(self):
+        """Return pool sizes and hit/miss counters"""
+        with self.lock:
+            return {
+                "pool_size": self.pool_size,
+                "refill_rate": self.refill_rate,
+                "originals": len(self.pools),
+                "ready": sum(len(pool) for pool in self.pools.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refilled": self.refilled
+            }
+    
+    def stop(self):
+        """Stop the background refill thread"""
+        self._stopped = True
+        self.wakeup.set()
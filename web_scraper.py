@@ -1,211 +1,407 @@
-import requests
-from bs4 import BeautifulSoup
 import os
 import json
-import re
-import time
-from urllib.parse import urljoin
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import random
+import sys
+from crawler import Crawler
+from http_cache import ResponseCache
+from dedup import DedupIndex
+from crawl_state import CrawlState, content_hash
+from page_parser import DEFAULT_PARSER, parse_madas_index, parse_pmt_index, parse_topic_page
+from metrics import histogram
+
+PARSE_SECONDS = histogram("scraper_parse_seconds", "Time spent parsing each topic page in a parse worker",
+                          ["source"])
+MERGE_SECONDS = histogram("scraper_merge_seconds", "Time spent merging the questions of each topic page",
+                          ["source"])
+
+MADAS_MATHS_URL = "https://www.madasmaths.com/archive/maths_topics.htm"
+PHYSICS_MATHS_TUTOR_URL = "https://www.physicsandmathstutor.com/maths-revision/further-maths/"
+
+# Question templates per topic used to simulate questions extracted from PDFs
+QUESTION_TEMPLATES = {
+    "Complex Numbers": [
+        "Find the modulus and argument of the complex number z = {a} + {b}i.",
+        "Express {a} + {b}i in the form re^(iθ), giving your answer in radians.",
+        "Find all the roots of the equation z^3 + {a}z + {b} = 0, where z is complex."
+    ],
+    "Matrices": [
+        "Find the determinant of the matrix A = [[{a}, {b}], [{c}, {d}]].",
+        "For the matrix A = [[{a}, {b}], [{c}, {d}]], find A^-1.",
+        "Determine whether the matrix A = [[{a}, {b}], [{c}, {d}]] is singular or non-singular."
+    ],
+    "Further Calculus": [
+        "Solve the differential equation dy/dx + {a}y = {b}e^({c}x), given that y = {d} when x = 0.",
+        "Find the Maclaurin series for f(x) = e^({a}x) up to and including the term in x^3.",
+        "Evaluate the improper integral ∫_0^∞ x^{a}e^(-{b}x) dx."
+    ],
+    "Further Vectors": [
+        "Find the equation of the plane passing through the points ({a}, {b}, {c}), ({d}, {e}, {f}), and ({g}, {h}, {i}).",
+        "Find the shortest distance between the lines r = ({a}i + {b}j + {c}k) + t({d}i + {e}j + {f}k) and r = ({g}i + {h}j + {i}k) + s({j}i + {k}j + {l}k).",
+        "Determine whether the vectors a = ({a}i + {b}j + {c}k) and b = ({d}i + {e}j + {f}k) are parallel, perpendicular, or neither."
+    ],
+    "Polar Coordinates": [
+        "Convert the point ({a}, {b}) from Cartesian to polar coordinates.",
+        "Find the area enclosed by the curve r = {a} + {b}cos(θ) for 0 ≤ θ ≤ 2π.",
+        "Sketch the curve r = {a}sin({b}θ) and identify any symmetry properties."
+    ],
+    "Hyperbolic Functions": [
+        "Prove the identity cosh^2(x) - sinh^2(x) = 1.",
+        "Solve the equation sinh(x) = {a}.",
+        "Express {a}sinh(x) + {b}cosh(x) in the form {c}sinh(x + {d})."
+    ],
+    "Further Statistics": [
+        "A discrete random variable X has probability generating function G(t) = {a}t + {b}t^2 + {c}t^3. Find P(X = 2).",
+        "Perform a chi-squared test at the {a}% significance level with the following contingency table: {b}.",
+        "Find the moment generating function for the random variable X which follows a Poisson distribution with parameter λ = {a}."
+    ],
+    "Further Mechanics": [
+        "A particle of mass {a}kg is moving with speed {b}m/s when it collides with a stationary particle of mass {c}kg. If the coefficient of restitution is e = {d}, find the velocities of both particles after the collision.",
+        "A particle is moving in a horizontal circle at constant speed under the action of a central force. If the radius of the circle is {a}m and the angular velocity is {b}rad/s, find the magnitude of the central force on a particle of mass {c}kg.",
+        "A particle is projected with speed {a}m/s at an angle of {b}° to the horizontal. Find the maximum height reached and the range on horizontal ground."
+    ]
+}
+
+def fill_template(template, rng):
+    """Fill a question template with random values, always drawn in the same order"""
+    return template.format(
+        a=rng.randint(1, 10),
+        b=rng.randint(1, 10),
+        c=rng.randint(1, 5) * (-1 if rng.random() > 0.5 else 1),
+        d=rng.randint(1, 5),
+        e=rng.randint(1, 5),
+        f=rng.randint(1, 5),
+        g=rng.randint(1, 5),
+        h=rng.randint(1, 5),
+        i=rng.randint(1, 5),
+        j=rng.randint(1, 5),
+        k=rng.randint(1, 5),
+        l=rng.randint(1, 5)
+    )
+
+def question_id(prefix, url, text):
+    """ID of a scraped question from its source URL and text, so re-scrapes and merges keep it stable"""
+    digest = content_hash(url + "\n" + text)
+    return f"{prefix}_{digest[:12]}"
+
+def sample_mark_scheme(question_text):
+    """Generate a plausible mark scheme for a given question"""
+    # This is a simplified demonstration
+    # In a real application, you would need more sophisticated logic
+    
+    if "complex number" in question_text.lower():
+        return "Apply formula |z| = √(a² + b²) for modulus\nUse arg(z) = tan⁻¹(b/a) for argument\nCheck quadrant and adjust argument if necessary"
+    
+    elif "determinant" in question_text.lower():
+        return "For a 2×2 matrix [[a, b], [c, d]], det(A) = ad - bc\nSubstitute values and calculate"
+    
+    elif "differential equation" in question_text.lower():
+        return "Identify as first order linear DE of form dy/dx + P(x)y = Q(x)\nFind integrating factor e^(∫P(x)dx)\nMultiply both sides by integrating factor\nIntegrate to find general solution\nApply initial condition to find particular solution"
+    
+    elif "matrix" in question_text.lower():
+        return "For a 2×2 matrix A = [[a, b], [c, d]], A⁻¹ = 1/det(A) × [[d, -b], [-c, a]]\nCalculate det(A) = ad - bc\nEnsure det(A) ≠ 0 for matrix to be invertible\nSubstitute into formula to find inverse"
+    
+    elif "vector" in question_text.lower():
+        return "For vectors a and b, dot product a·b = |a||b|cos(θ)\nVectors are parallel if a = kb for some scalar k\nVectors are perpendicular if a·b = 0\nCalculate dot product and determine relationship"
+    
+    else:
+        # Generic mark scheme
+        return "Identify the correct mathematical approach\nApply relevant formulas\nPerform algebraic manipulations\nReach the final answer in the requested form\nCheck solution meets all constraints"
 
 class MathQuestionScraper:
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, seed=None, crawler=None, madas_url=MADAS_MATHS_URL,
+                 pmt_url=PHYSICS_MATHS_TUTOR_URL, cache=None, offline=False,
+                 dedup_level="exact", fuzzy_dedup=False, parser=DEFAULT_PARSER,
+                 parse_workers=None, queue_size=64, checkpoint_every=10, search_index=None):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        # The crawler enforces per-host concurrency, rate limits, timeouts and retries
+        self.crawler = crawler or Crawler(headers=self.headers)
+        # Source URLs can be pointed at a local fixture server for offline runs
+        self.madas_url = madas_url
+        self.pmt_url = pmt_url
+        self.lock = threading.RLock()
         self.output_dir = "scraped_data"
         os.makedirs(self.output_dir, exist_ok=True)
+        self.database_path = os.path.join(self.output_dir, "question_database.json")
+        # Pending pages and content hashes of merged ones survive between runs, so an
+        # interrupted crawl resumes and unchanged pages are not processed again
+        self.state = CrawlState(os.path.join(self.output_dir, "crawl_state.json"))
+        self.checkpoint_every = checkpoint_every
+        # Responses are cached on disk and revalidated with conditional requests;
+        # offline mode replays the cache without touching the network
+        self.cache = cache or ResponseCache(os.path.join(self.output_dir, "http_cache"))
+        self.offline = offline
+        # Topic pages are parsed in a process pool (parse_workers=None uses every
+        # core, 0 parses on a single thread) with lxml when it is installed
+        self.parser = parser
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
         self.questions_db = {}
+        # Scraped questions are rejected when they match a stored one at dedup_level.
+        # The default only drops exact repeats (after whitespace normalisation);
+        # "template" also drops questions that differ only in their numbers, and
+        # "fuzzy" near-duplicates, so both must be asked for explicitly
+        self.dedup = DedupIndex(fuzzy=fuzzy_dedup or dedup_level == "fuzzy")
+        self.dedup_level = dedup_level
+        # A SearchIndex (e.g. QuestionDatabase.search_index()) to update as pages are merged
+        self.search_index = search_index
+        # A seeded scraper produces the same sample questions on every run
+        self.seed = seed
+        self.rng = random.Random(seed)
         
     def get_page(self, url):
-        """Fetch a page with retry mechanism"""
-        max_retries = 3
-        for i in range(max_retries):
-            try:
-                response = self.session.get(url, headers=self.headers)
-                response.raise_for_status()
-                return response.text
-            except requests.RequestException as e:
-                print(f"Error fetching {url}: {e}")
-                if i < max_retries - 1:
-                    wait_time = 2 ** i  # Exponential backoff
-                    print(f"Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                else:
-                    print("Max retries reached. Skipping this URL.")
-                    return None
+        """Fetch a page, revalidating any cached copy instead of re-downloading it"""
+        if self.offline:
+            entry = self.cache.get(url)
+            if entry is None:
+                print(f"Not in cache (offline mode): {url}")
+                return None
+            return entry["body"]
+        
+        response = self.crawler.request(url, self.cache.conditional_headers(url))
+        if response is None:
+            # Fall back to a stale copy rather than losing the page
+            entry = self.cache.get(url)
+            return entry["body"] if entry else None
+        
+        if response.status_code == 304:
+            entry = self.cache.get(url)
+            if entry is not None:
+                self.cache.mark_validated(url)
+                return entry["body"]
+            # Validators without a body (e.g. a deleted file): fetch unconditionally
+            response = self.crawler.request(url)
+            if response is None:
+                return None
+        
+        if response.status_code != 200:
+            print(f"Error fetching {url}: HTTP {response.status_code}")
+            return None
+        
+        self.cache.store(url, response)
+        return response.text
     
     def scrape_madas_maths(self):
         """Scrape questions from MadAsMaths"""
-        base_url = "https://www.madasmaths.com/archive/maths_topics.htm"
+        self.process_topic_pages(self._madas_topic_pages())
+    
+    def scrape_physics_maths_tutor(self):
+        """Scrape questions from Physics & Maths Tutor"""
+        self.process_topic_pages(self._pmt_topic_pages())
+    
+    def _madas_topic_pages(self):
+        """Return (source, topic, url) for each Further Maths topic page on MadAsMaths"""
+        base_url = self.madas_url
         print(f"Scraping MadAsMaths from {base_url}")
         
         html = self.get_page(base_url)
         if not html:
-            return
-        
-        soup = BeautifulSoup(html, 'html.parser')
+            return []
         
         # Find FM (Further Maths) links
-        fm_links = []
-        for link in soup.find_all('a', href=True):
-            if "FM_" in link['href'] or "further" in link['href'].lower():
-                full_url = urljoin(base_url, link['href'])
-                topic = link.text.strip()
-                fm_links.append((topic, full_url))
-        
+        fm_links = parse_madas_index(html, base_url, self.parser)
         print(f"Found {len(fm_links)} Further Maths topic links on MadAsMaths")
+        return [("madas", topic, url) for topic, url in fm_links]
         
-        # Process each topic link
-        for topic, url in fm_links:
-            print(f"Processing MadAsMaths topic: {topic}")
-            topic_html = self.get_page(url)
-            if not topic_html:
-                continue
-            
-            topic_soup = BeautifulSoup(topic_html, 'html.parser')
-            
-            # Extract questions directly from the page
-            # MadAsMaths often has questions embedded in the page
-            self._extract_madas_questions(topic_soup, topic, url)
-            
-            # Also look for PDF links
-            for pdf_link in topic_soup.find_all('a', href=True):
-                if pdf_link['href'].endswith('.pdf'):
-                    pdf_url = urljoin(url, pdf_link['href'])
-                    # For simulation, generate some sample questions for this PDF
-                    self._generate_sample_questions(pdf_url, topic, 3)
-            
-            # Be nice to the server
-            time.sleep(1)
-            
-    def _extract_madas_questions(self, soup, topic, url):
-        """Extract questions embedded in MadAsMaths pages"""
-        # MadAsMaths often has numbered questions in divs or paragraphs
-        question_sections = soup.find_all(['div', 'p'], class_=lambda c: c and ('question' in c.lower() or 'problem' in c.lower()))
-        
-        if not question_sections:
-            # Try finding questions by pattern
-            all_paragraphs = soup.find_all(['p', 'div'])
-            for i, p in enumerate(all_paragraphs):
-                text = p.get_text().strip()
-                # Look for question-like patterns (1. or Question 1:)
-                if re.match(r'^(\d+\.|\(?\d+\)|Question\s+\d+:)', text):
-                    # Generate a sample question based on this text
-                    self._add_question_to_db({
-                        "id": f"madas_{topic.replace(' ', '_')}_{i}",
-                        "topic": self._determine_topic(topic, text),
-                        "question_text": text,
-                        "mark_scheme": self._generate_mark_scheme(text),
-                        "total_marks": random.randint(3, 10),
-                        "source_url": url
-                    })
-    
-    def scrape_physics_maths_tutor(self):
-        """Scrape questions from Physics & Maths Tutor"""
-        base_url = "https://www.physicsandmathstutor.com/maths-revision/further-maths/"
+    def _pmt_topic_pages(self):
+        """Return (source, topic, url) for each Further Maths topic page on Physics & Maths Tutor"""
+        base_url = self.pmt_url
         print(f"Scraping Physics & Maths Tutor from {base_url}")
         
         html = self.get_page(base_url)
         if not html:
-            return
-        
-        soup = BeautifulSoup(html, 'html.parser')
+            return []
         
         # Find topic links within the further maths section
-        topic_links = []
-        main_content = soup.find('div', class_='main-content')
-        if main_content:
-            for link in main_content.find_all('a', href=True):
-                if "further-maths" in link['href']:
-                    full_url = urljoin(base_url, link['href'])
-                    topic = link.text.strip()
-                    topic_links.append((topic, full_url))
-        
+        topic_links = parse_pmt_index(html, base_url, self.parser)
         print(f"Found {len(topic_links)} Further Maths topic links on Physics & Maths Tutor")
+        return [("pmt", topic, url) for topic, url in topic_links]
         
-        # Process each topic
-        for topic, url in topic_links:
-            print(f"Processing PMT topic: {topic}")
-            topic_html = self.get_page(url)
-            if not topic_html:
-                continue
-            
-            topic_soup = BeautifulSoup(topic_html, 'html.parser')
-            
-            # Find links to question papers and mark schemes
-            paper_links = []
-            resource_section = topic_soup.find('div', class_=['resources', 'papers'])
-            if resource_section:
-                for link in resource_section.find_all('a', href=True):
-                    if link['href'].endswith('.pdf'):
-                        paper_url = urljoin(url, link['href'])
-                        link_text = link.text.strip().lower()
-                        if 'question' in link_text:
-                            paper_links.append((topic, paper_url, 'question'))
-                        elif 'mark' in link_text:
-                            paper_links.append((topic, paper_url, 'mark scheme'))
+    def process_topic_pages(self, pages):
+        """Fetch, parse and merge (source, topic, url) pages as a three-stage pipeline
+        
+        Fetching runs on the crawler's threads, parsing in a process pool and
+        merging on the calling thread. Bounded queues between the stages keep a
+        fast stage from running arbitrarily far ahead of a slow one.
+        
+        Pages left in the crawl state's frontier by an earlier run are processed
+        too, pages whose content hash matches their last merge are skipped, and
+        the database and crawl state are checkpointed every checkpoint_every pages.
+        """
+        pages = self.state.extend_frontier(pages)
+        self.state.save()
+        skipped = []
+        merged = 0
+        
+        fetched = queue.Queue(maxsize=self.queue_size)
+        parsed = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        
+        def fetch_stage():
+            try:
+                items = (((source, topic), url) for source, topic, url in pages)
+                for (source, topic), url, html in self.crawler.fetch_all(items, self.get_page):
+                    if stop.is_set():
+                        break
+                    fetched.put((source, topic, url, html))
+            finally:
+                fetched.put(None)
+        
+        def parse_stage(pool):
+            try:
+                while not stop.is_set():
+                    item = fetched.get()
+                    if item is None:
+                        break
+                    source, topic, url, html = item
+                    if not html:
+                        # Stays in the frontier so the next run retries it
+                        continue
+                    
+                    digest = content_hash(html)
+                    if self.state.is_unchanged(url, digest):
+                        self.state.complete(url, digest)
+                        skipped.append(url)
+                        continue
+                    
+                    # The queue holds futures, so at most queue_size parses are in flight
+                    parsed.put((url, digest, pool.submit(parse_topic_page, source, topic, url, html, self.parser)))
+            finally:
+                parsed.put(None)
+        
+        if self.parse_workers == 0:
+            pool = ThreadPoolExecutor(max_workers=1)
+        else:
+            # Spawned workers only import page_parser and never inherit crawler threads
+            pool = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        stages = [threading.Thread(target=fetch_stage, daemon=True),
+                  threading.Thread(target=parse_stage, args=(pool,), daemon=True)]
+        for stage in stages:
+            stage.start()
+        
+        try:
+            while True:
+                item = parsed.get()
+                if item is None:
+                    break
+                url, digest, future = item
+                try:
+                    source, topic, url, result, parse_seconds = future.result()
+                except Exception as e:
+                    print(f"Error parsing page: {e}")
+                    continue
+                PARSE_SECONDS.observe(parse_seconds, source)
+                with MERGE_SECONDS.time(source):
+                    question_ids = self._merge_topic_page(source, topic, url, result)
+                self.state.complete(url, digest, question_ids)
+                merged += 1
+                if merged % self.checkpoint_every == 0:
+                    self.checkpoint()
+        finally:
+            # On an error downstream, drain the queues so the upstream stages can exit
+            stop.set()
+            while any(stage.is_alive() for stage in stages):
+                for q in (fetched, parsed):
+                    try:
+                        q.get(timeout=0.05)
+                    except queue.Empty:
+                        pass
+            for stage in stages:
+                stage.join()
+            pool.shutdown(wait=True)
+            self.checkpoint()
+        
+        print(f"Merged {merged} new or changed pages, skipped {len(skipped)} unchanged pages")
+    
+    def _merge_topic_page(self, source, topic, url, result):
+        """Classify, deduplicate and store the questions parsed from one topic page
+        
+        The questions stored for the page at its last merge are replaced: any
+        the page no longer produces are removed first. Returns the IDs of the
+        questions now stored for the page.
+        """
+        questions = []
+        if source == "madas":
+            print(f"Processing MadAsMaths topic: {topic}")
+            for _, text in result["questions"]:
+                # Generate a sample question based on this text
+                questions.append(({
+                    "id": question_id(f"madas_{topic.replace(' ', '_')}", url, text),
+                    "topic": self._determine_topic(topic, text),
+                    "question_text": text,
+                    "mark_scheme": self._generate_mark_scheme(text),
+                    "total_marks": self.rng.randint(3, 10),
+                    "source_url": url
+                }, None))
             
+            for pdf_url in result["pdf_links"]:
+                # For simulation, generate some sample questions for this PDF; seeding
+                # by URL makes a re-crawl produce the same (deduplicated) questions
+                questions.extend((question, "exact") for question in
+                                 self._sample_questions(pdf_url, topic, 3, seed=f"{self.seed}:{pdf_url}"))
+            sources = [url] + list(result["pdf_links"])
+        else:
+            print(f"Processing PMT topic: {topic}")
             # For each question paper, generate sample questions
-            for topic, paper_url, paper_type in paper_links:
+            sources = [url]
+            for paper_url, paper_type in result["paper_links"]:
                 if paper_type == 'question':
                     # For simulation, generate some sample questions
-                    self._generate_sample_questions(paper_url, topic, 5)
-            
-            # Be nice to the server
-            time.sleep(1)
+                    questions.extend((question, "exact") for question in
+                                     self._sample_questions(paper_url, topic, 5, seed=f"{self.seed}:{paper_url}"))
+                    sources.append(paper_url)
+        
+        self._drop_stale_questions(url, sources, {question["id"] for question, _ in questions})
+        stored = []
+        for question, level in questions:
+            if self._add_question_to_db(question, level=level) == question["id"]:
+                stored.append(question["id"])
+        return stored
+    
+    def _drop_stale_questions(self, url, sources, current_ids):
+        """Remove questions a page produced at its last merge but no longer does"""
+        previous = self.state.page_questions(url)
+        with self.lock:
+            if previous is None:
+                # Merged before pages recorded their questions: go by source URL instead
+                sources = set(sources)
+                previous = [q["id"] for questions in self.questions_db.values() for q in questions
+                            if q.get("source_url") in sources and not q.get("generated")]
+            stale = set(previous) - current_ids
+            if not stale:
+                return
+            for topic, questions in self.questions_db.items():
+                kept = []
+                for question in questions:
+                    if question["id"] in stale:
+                        if question.get("question_text"):
+                            self.dedup.remove(question["question_text"], question["id"], topic)
+                    else:
+                        kept.append(question)
+                questions[:] = kept
+        print(f"Removed {len(stale)} questions no longer on {url}")
+    
+    def _generate_sample_questions(self, url, topic, count=3, seed=None):
+        """Generate sample questions to simulate extraction from PDFs and add them to the database"""
+        for question in self._sample_questions(url, topic, count, seed):
+            # Samples are template instances by design, so only exact repeats are dropped
+            self._add_question_to_db(question, level="exact")
     
-    def _generate_sample_questions(self, url, topic, count=3):
-        """Generate sample questions to simulate extraction from PDFs"""
+    def _sample_questions(self, url, topic, count=3, seed=None):
+        """Return sample questions simulating those extracted from a PDF"""
+        rng = random.Random(seed) if seed is not None else self.rng
         print(f"Generating {count} sample questions for {topic} from {url}")
         
-        # Templates for different topics
-        question_templates = {
-            "Complex Numbers": [
-                "Find the modulus and argument of the complex number z = {a} + {b}i.",
-                "Express {a} + {b}i in the form re^(iθ), giving your answer in radians.",
-                "Find all the roots of the equation z^3 + {a}z + {b} = 0, where z is complex."
-            ],
-            "Matrices": [
-                "Find the determinant of the matrix A = [[{a}, {b}], [{c}, {d}]].",
-                "For the matrix A = [[{a}, {b}], [{c}, {d}]], find A^-1.",
-                "Determine whether the matrix A = [[{a}, {b}], [{c}, {d}]] is singular or non-singular."
-            ],
-            "Further Calculus": [
-                "Solve the differential equation dy/dx + {a}y = {b}e^({c}x), given that y = {d} when x = 0.",
-                "Find the Maclaurin series for f(x) = e^({a}x) up to and including the term in x^3.",
-                "Evaluate the improper integral ∫_0^∞ x^{a}e^(-{b}x) dx."
-            ],
-            "Further Vectors": [
-                "Find the equation of the plane passing through the points ({a}, {b}, {c}), ({d}, {e}, {f}), and ({g}, {h}, {i}).",
-                "Find the shortest distance between the lines r = ({a}i + {b}j + {c}k) + t({d}i + {e}j + {f}k) and r = ({g}i + {h}j + {i}k) + s({j}i + {k}j + {l}k).",
-                "Determine whether the vectors a = ({a}i + {b}j + {c}k) and b = ({d}i + {e}j + {f}k) are parallel, perpendicular, or neither."
-            ],
-            "Polar Coordinates": [
-                "Convert the point ({a}, {b}) from Cartesian to polar coordinates.",
-                "Find the area enclosed by the curve r = {a} + {b}cos(θ) for 0 ≤ θ ≤ 2π.",
-                "Sketch the curve r = {a}sin({b}θ) and identify any symmetry properties."
-            ],
-            "Hyperbolic Functions": [
-                "Prove the identity cosh^2(x) - sinh^2(x) = 1.",
-                "Solve the equation sinh(x) = {a}.",
-                "Express {a}sinh(x) + {b}cosh(x) in the form {c}sinh(x + {d})."
-            ],
-            "Further Statistics": [
-                "A discrete random variable X has probability generating function G(t) = {a}t + {b}t^2 + {c}t^3. Find P(X = 2).",
-                "Perform a chi-squared test at the {a}% significance level with the following contingency table: {b}.",
-                "Find the moment generating function for the random variable X which follows a Poisson distribution with parameter λ = {a}."
-            ],
-            "Further Mechanics": [
-                "A particle of mass {a}kg is moving with speed {b}m/s when it collides with a stationary particle of mass {c}kg. If the coefficient of restitution is e = {d}, find the velocities of both particles after the collision.",
-                "A particle is moving in a horizontal circle at constant speed under the action of a central force. If the radius of the circle is {a}m and the angular velocity is {b}rad/s, find the magnitude of the central force on a particle of mass {c}kg.",
-                "A particle is projected with speed {a}m/s at an angle of {b}° to the horizontal. Find the maximum height reached and the range on horizontal ground."
-            ]
-        }
         
         # Determine which templates to use
         template_key = None
-        for key in question_templates.keys():
+        for key in QUESTION_TEMPLATES.keys():
             if key.lower() in topic.lower():
                 template_key = key
                 break
@@ -214,65 +410,31 @@ class MathQuestionScraper:
             # Default to Further Calculus if no specific match
             template_key = "Further Calculus"
         
-        templates = question_templates[template_key]
+        templates = QUESTION_TEMPLATES[template_key]
         
         # Generate sample questions
+        questions = []
         for i in range(count):
             # Choose a random template
-            template = random.choice(templates)
+            template = rng.choice(templates)
             
             # Fill in random values
-            question_text = template.format(
-                a=random.randint(1, 10),
-                b=random.randint(1, 10),
-                c=random.randint(1, 5) * (-1 if random.random() > 0.5 else 1),
-                d=random.randint(1, 5),
-                e=random.randint(1, 5),
-                f=random.randint(1, 5),
-                g=random.randint(1, 5),
-                h=random.randint(1, 5),
-                i=random.randint(1, 5),
-                j=random.randint(1, 5),
-                k=random.randint(1, 5),
-                l=random.randint(1, 5)
-            )
+            question_text = fill_template(template, rng)
             
             # Create question object
-            question = {
-                "id": f"{template_key.lower().replace(' ', '_')}_{len(self.questions_db.get(template_key, []))+1}",
+            questions.append({
+                "id": question_id(template_key.lower().replace(' ', '_'), url, question_text),
                 "topic": template_key,
                 "question_text": question_text,
                 "mark_scheme": self._generate_mark_scheme(question_text),
-                "total_marks": random.randint(3, 10),
+                "total_marks": rng.randint(3, 10),
                 "source_url": url
-            }
-            
-            # Add to database
-            self._add_question_to_db(question)
+            })
+        return questions
     
     def _generate_mark_scheme(self, question_text):
         """Generate a plausible mark scheme for a given question"""
-        # This is a simplified demonstration
-        # In a real application, you would need more sophisticated logic
-        
-        if "complex number" in question_text.lower():
-            return "Apply formula |z| = √(a² + b²) for modulus\nUse arg(z) = tan⁻¹(b/a) for argument\nCheck quadrant and adjust argument if necessary"
-        
-        elif "determinant" in question_text.lower():
-            return "For a 2×2 matrix [[a, b], [c, d]], det(A) = ad - bc\nSubstitute values and calculate"
-        
-        elif "differential equation" in question_text.lower():
-            return "Identify as first order linear DE of form dy/dx + P(x)y = Q(x)\nFind integrating factor e^(∫P(x)dx)\nMultiply both sides by integrating factor\nIntegrate to find general solution\nApply initial condition to find particular solution"
-        
-        elif "matrix" in question_text.lower():
-            return "For a 2×2 matrix A = [[a, b], [c, d]], A⁻¹ = 1/det(A) × [[d, -b], [-c, a]]\nCalculate det(A) = ad - bc\nEnsure det(A) ≠ 0 for matrix to be invertible\nSubstitute into formula to find inverse"
-        
-        elif "vector" in question_text.lower():
-            return "For vectors a and b, dot product a·b = |a||b|cos(θ)\nVectors are parallel if a = kb for some scalar k\nVectors are perpendicular if a·b = 0\nCalculate dot product and determine relationship"
-        
-        else:
-            # Generic mark scheme
-            return "Identify the correct mathematical approach\nApply relevant formulas\nPerform algebraic manipulations\nReach the final answer in the requested form\nCheck solution meets all constraints"
+        return sample_mark_scheme(question_text)
     
     def _determine_topic(self, main_topic, question_text):
         """Determine the specific topic of a question based on keywords"""
@@ -296,24 +458,64 @@ class MathQuestionScraper:
         # If no specific match, use the main topic
         return main_topic
     
-    def _add_question_to_db(self, question):
-        """Add a question to the database"""
-        topic = question["topic"]
-        if topic not in self.questions_db:
-            self.questions_db[topic] = []
+    def _add_question_to_db(self, question, level=None):
+        """Add a question to the database unless it duplicates one already in its topic
         
-        # Check if question is already in database to avoid duplicates
-        for existing in self.questions_db[topic]:
-            if existing["question_text"] == question["question_text"]:
-                return
-        
-        self.questions_db[topic].append(question)
+        Returns the ID the question is stored under: its own, or the duplicate's.
+        """
+        topic = question["topic"]
+        with self.lock:
+            if topic not in self.questions_db:
+                self.questions_db[topic] = []
+        
+            # Check if question is already in database to avoid duplicates
+            duplicate = self.dedup.find(question["question_text"], topic, level or self.dedup_level)
+            if duplicate is not None:
+                print(f"Skipping duplicate of {duplicate} in topic: {topic}")
+                return duplicate
+        
+            self.dedup.add(question["question_text"], question["id"], topic)
+            self.questions_db[topic].append(question)
+        if self.search_index is not None:
+            self.search_index.add_question(question)
         print(f"Added question to topic: {topic}")
+        return question["id"]
+    
+    def load_existing_database(self):
+        """Load the saved database so a crawl merges into it instead of replacing it"""
+        try:
+            with open(self.database_path, "r") as f:
+                saved_db = json.load(f)
+        except FileNotFoundError:
+            return
+        
+        with self.lock:
+            for topic, questions in saved_db.items():
+                for question in questions:
+                    # Lazily stored variants have no text to compare
+                    if question.get("question_text"):
+                        self.dedup.add(question["question_text"], question["id"], topic)
+                self.questions_db.setdefault(topic, []).extend(questions)
+        print(f"Loaded {sum(len(q) for q in saved_db.values())} existing questions from {self.database_path}")
+    
+    def _write_database(self):
+        """Write the question database atomically via a temp file"""
+        tmp_path = self.database_path + ".tmp"
+        with self.lock:
+            with open(tmp_path, "w") as f:
+                json.dump(self.questions_db, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.database_path)
+    
+    def checkpoint(self):
+        """Save the database, then the crawl state, so merged pages are never lost"""
+        self._write_database()
+        self.state.save()
     
     def save_database(self):
         """Save the question database to a JSON file"""
-        with open(os.path.join(self.output_dir, "question_database.json"), "w") as f:
-            json.dump(self.questions_db, f, indent=2)
+        self._write_database()
         
         total_questions = sum(len(questions) for questions in self.questions_db.values())
         topic_counts = {topic: len(questions) for topic, questions in self.questions_db.items()}
@@ -327,15 +529,26 @@ class MathQuestionScraper:
         """Execute the full scraping process"""
         print("Starting scraping process for Further Maths A-Level questions...")
         
-        # Scrape from multiple sources
-        self.scrape_madas_maths()
-        self.scrape_physics_maths_tutor()
+        # Merge into the existing database rather than overwriting it
+        self.load_existing_database()
+        if self.state.pending():
+            print(f"Resuming crawl with {self.state.pending()} pending pages")
+        
+        # Read both index pages in parallel, then run every topic page through one
+        # pipeline; the crawler keeps each host rate limited
+        with ThreadPoolExecutor(max_workers=2) as sources:
+            madas_pages = sources.submit(self._madas_topic_pages)
+            pmt_pages = sources.submit(self._pmt_topic_pages)
+            pages = madas_pages.result() + pmt_pages.result()
+        self.process_topic_pages(pages)
+        self.crawler.close()
         
         # Generate additional sample questions for topics with few questions
         self._ensure_minimum_questions_per_topic()
         
         # Save the final database
         self.save_database()
+        self.state.save()
         print("Scraping complete!")
     
     def _ensure_minimum_questions_per_topic(self, min_questions=5):
@@ -362,12 +575,15 @@ class MathQuestionScraper:
                 
                 if needed > 0:
                     # Generate some sample questions
+                    url = f"https://example.com/sample/{topic.lower().replace(' ', '_')}.pdf"
                     self._generate_sample_questions(
-                        url=f"https://example.com/sample/{topic.lower().replace(' ', '_')}.pdf",
+                        url=url,
                         topic=topic,
-                        count=needed
+                        count=needed,
+                        seed=f"{self.seed}:{url}"
                     )
 
 if __name__ == "__main__":
-    scraper = MathQuestionScraper()
+    # python web_scraper.py --offline replays the last crawl from scraped_data/http_cache
+    scraper = MathQuestionScraper(offline="--offline" in sys.argv)
     scraper.run()
\ No newline at end of file
@@ -0,0 +1,81 @@
+import queue
+import threading
+import time
+
+class WriteBehindWriter:
+    def __init__(self, flush, batch_size=256, interval=0.5, maxsize=10000, max_retries=5):
+        self.flush = flush
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_retries = max_retries
+        # Items whose flush kept failing, and the last error; close() raises it
+        self.failed = []
+        self.error = None
+        # A bounded queue makes producers wait when the disk falls behind
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def put_many(self, items):
+        """Queue items for writing, blocking while the queue is full"""
+        for item in items:
+            self.queue.put(item)
+    
+    def _collect(self):
+        # Wait for the first item, then keep gathering until the batch is full or stale
+        try:
+            batch = [self.queue.get(timeout=self.interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        batch = []
+        # Consecutive failed flushes; once past max_retries each batch gets a single try
+        failures = 0
+        while not (self._stopped and not batch and self.queue.empty()):
+            if not batch:
+                batch = self._collect()
+                if not batch:
+                    continue
+            try:
+                self.flush(batch)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                if failures <= self.max_retries:
+                    # Keep the batch and try again, backing off a little more each time
+                    print(f"Warning: Write-behind flush failed, retrying: {e}")
+                    time.sleep(self.interval * failures)
+                    continue
+                # A persistent error (disk full, read-only database) must not hang shutdown
+                print(f"Error: Write-behind flush failed {failures} times, giving up on {len(batch)} items: {e}")
+                self.failed.extend(batch)
+                self.error = e
+            for _ in batch:
+                self.queue.task_done()
+            batch = []
+    
+    def wait(self):
+        """Block until everything queued so far has been written"""
+        self.queue.join()
+    
+    def close(self):
+        """Write out everything still queued and stop the writer thread
+        
+        Raises RuntimeError if any items could not be written; they are kept in `failed`.
+        """
+        self._stopped = True
+        self._thread.join()
+        if self.error is not None:
+            raise RuntimeError(f"Write-behind writer could not persist {len(self.failed)} items") from self.error